@@ -0,0 +1,107 @@
+"""
+Attach many files to entries at once.
+"""
+
+import concurrent.futures
+import csv
+import os
+
+import click
+
+from . import files
+from . import internals
+
+WORKERS = 8
+
+
+def read_csv(f):
+    """
+    Read KEY,FILE rows from the open file `f`, skipping empty rows and an
+    optional ``key,file`` header.
+    Return a list of (key, file) tuples.
+    """
+    pairs = []
+    for lineno, row in enumerate(csv.reader(f), 1):
+        row = [cell.strip() for cell in row]
+        if not any(row):
+            continue
+        if len(row) != 2:
+            msg = "line {}: expected KEY,FILE, got {}".format(lineno, ",".join(row))
+            raise click.ClickException(msg)
+        if lineno == 1 and [cell.lower() for cell in row] == ["key", "file"]:
+            continue
+        pairs.append((row[0], row[1]))
+    return pairs
+
+
+def match_files(data, paths):
+    """
+    Match every file in `paths` to the entry whose key has the same basename
+    (see `internals.string_to_basename`), e.g. ``tolkien1937hobit.pdf``.
+    Return a list of (key, file) tuples, with a None key for files that
+    match no entry.
+    """
+    keys = {}
+    for entry in internals.bib_entries(data):
+        keys.setdefault(internals.string_to_basename(entry["key"]), entry["key"])
+    pairs = []
+    for path in paths:
+        stem, _ = os.path.splitext(os.path.basename(path))
+        pairs.append((keys.get(internals.string_to_basename(stem)), path))
+    return pairs
+
+
+def plan(data, pairs, destination):
+    """
+    Check every (key, file) pair, and find where to put each file.
+    Return a list of (entry, file, path) jobs, and a list of errors for the
+    pairs that can't be attached.
+    """
+    entries = {e["key"]: e for e in internals.bib_entries(data)}
+    jobs = []
+    errors = []
+    paths = set()
+    for key, file_ in pairs:
+        if key is None:
+            errors.append("No entry matches {}".format(file_))
+        elif key not in entries:
+            errors.append('Couldn\'t find "{}"'.format(key))
+        elif not os.path.isfile(file_):
+            errors.append("{} doesn't exist".format(file_))
+        else:
+            entry = entries[key]
+            path = internals.file_destination(entry, file_, destination)
+            if os.path.exists(path) or path in paths:
+                errors.append("{} already exists".format(path))
+            else:
+                paths.add(path)
+                jobs.append((entry, file_, path))
+    return jobs, errors
+
+
+def place_all(jobs, link="copy", store=None, workers=WORKERS):
+    """
+    Place the files of `jobs` (as returned by `plan`) concurrently, with a
+    progress bar, and set the file field of every entry whose file was
+    placed.
+    Return the number of placed files and a list of errors.
+    """
+    placed = 0
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(files.place, file_, path, link, store): (entry, path)
+            for entry, file_, path in jobs
+        }
+        with click.progressbar(length=len(jobs), label="Attaching files") as bar:
+            for future in concurrent.futures.as_completed(futures):
+                entry, path = futures[future]
+                bar.update(1)
+                try:
+                    future.result()
+                except OSError as e:
+                    errors.append("Failed to attach {}: {}".format(path, e))
+                    continue
+                entry["fields"]["file"] = path
+                placed += 1
+    return placed, errors
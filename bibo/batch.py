@@ -0,0 +1,243 @@
+"""
+Apply a stream of operations to the database in a single load / write cycle.
+"""
+
+import json
+import os
+import shlex
+
+import click
+import pybibs
+
+from . import files
+from . import internals
+
+OPERATIONS = ["add", "edit", "remove", "set-file"]
+
+
+class BatchError(click.ClickException):
+    def __init__(self, lineno, msg):
+        super().__init__("line {}: {}".format(lineno, msg))
+        self.lineno = lineno
+
+
+def parse(lines):
+    """
+    Yield (line number, operation) tuples, where an operation is a dict with
+    an ``op`` item and its arguments. Lines are either JSON objects or in the
+    simple line format. Empty lines and lines starting with ``#`` are skipped.
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            if line.startswith("{"):
+                op = json.loads(line)
+                if not isinstance(op, dict):
+                    raise ValueError("expected a JSON object")
+            else:
+                op = _parse_line(line)
+        except ValueError as e:
+            raise BatchError(lineno, str(e))
+        if op.get("op") not in OPERATIONS:
+            raise BatchError(lineno, 'unknown operation "{}"'.format(op.get("op")))
+        try:
+            _check_types(op)
+        except ValueError as e:
+            raise BatchError(lineno, str(e))
+        yield lineno, op
+
+
+def _check_types(op):
+    """
+    Raise `ValueError` if the arguments of `op` that are given have the
+    wrong type, e.g. in a JSON line.
+    """
+
+    def check(name, valid, expected):
+        if name in op and not valid(op[name]):
+            raise ValueError('"{}" must be {}'.format(name, expected))
+
+    def is_str(value):
+        return isinstance(value, str)
+
+    check("entry", is_str, "a string")
+    check("key", is_str, "a string")
+    if op["op"] == "edit":
+        check(
+            "fields",
+            lambda v: isinstance(v, dict) and all(map(is_str, v.values())),
+            "an object of strings",
+        )
+    elif op["op"] == "remove":
+        check(
+            "fields",
+            lambda v: isinstance(v, list) and all(map(is_str, v)),
+            "a list of strings",
+        )
+    for name in ["file", "destination", "link"]:
+        check(name, is_str, "a string")
+    check("no_copy", lambda v: isinstance(v, bool), "true or false")
+
+
+def _parse_line(line):
+    name, _, rest = line.partition(" ")
+    if name == "add":
+        return {"op": "add", "entry": rest}
+    args = shlex.split(rest)
+    if not args:
+        raise ValueError("missing key")
+    op = {"op": name, "key": args[0]}
+    args = args[1:]
+    if name == "edit":
+        op["fields"] = {}
+        for arg in args:
+            if "=" not in arg:
+                raise ValueError('expected FIELD=VALUE, got "{}"'.format(arg))
+            field, value = arg.split("=", 1)
+            op["fields"][field] = value
+    elif name == "remove":
+        op["fields"] = args
+    elif name == "set-file":
+        args = iter(args)
+        for arg in args:
+            if arg == "--no-copy":
+                op["no_copy"] = True
+            elif arg == "--destination":
+                op["destination"] = next(args, None)
+            elif arg == "--link":
+                op["link"] = next(args, None)
+            else:
+                op["file"] = arg
+    return op
+
+
+def apply(data, operations):
+    """
+    Apply `operations` (as yielded by `parse`) to `data` in place. Either all
+    of them are applied or, if one fails, none is.
+    Return the number of applied operations.
+    """
+    batch = _Batch(data)
+    count = 0
+    for lineno, op in operations:
+        try:
+            getattr(batch, op["op"].replace("-", "_"))(op)
+        except click.ClickException as e:
+            raise BatchError(lineno, e.message)
+        except (KeyError, TypeError) as e:
+            raise BatchError(lineno, "invalid operation: {!r}".format(e))
+        count += 1
+    batch.commit()
+    return count
+
+
+class _Batch:
+    """
+    Changes to a working copy of the data. Entries are copied before they
+    are changed, so the original data is untouched until `commit`.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.entries = list(data)
+        self.index = {
+            e["key"]: i
+            for i, e in enumerate(self.entries)
+            if e["type"].lower() not in internals.NON_BIB_TYPES
+        }
+        self.copied = set()
+        self.file_copies = {}  # Destination path -> (source path, link)
+        self._destination = None
+
+    def add(self, op):
+        try:
+            entry = pybibs.read_entry_string(op["entry"])
+        except (AssertionError, IndexError, ValueError):
+            raise click.ClickException("invalid entry")
+        if entry["type"].lower() in internals.NON_BIB_TYPES:
+            self.entries.append(entry)
+            return
+        self._unique_key_validation(entry["key"])
+        self.copied.add(len(self.entries))
+        self.index[entry["key"]] = len(self.entries)
+        self.entries.append(entry)
+
+    def edit(self, op):
+        key = op["key"]
+        entry = self._writable(key)
+        for field, value in op["fields"].items():
+            if field == "key":
+                if value != key:
+                    self._unique_key_validation(value)
+                    self.index[value] = self.index.pop(key)
+                    key = value
+                entry["key"] = value
+            elif field == "type":
+                entry["type"] = value
+            else:
+                entry["fields"][field] = value
+
+    def remove(self, op):
+        if not op.get("fields"):
+            i = self._position(op["key"])
+            del self.index[op["key"]]
+            self.entries[i] = None
+            return
+        entry = self._writable(op["key"])
+        for field in op["fields"]:
+            if field not in entry["fields"]:
+                msg = '"{}" has no field "{}"'.format(op["key"], field)
+                raise click.ClickException(msg)
+            del entry["fields"][field]
+
+    def set_file(self, op):
+        entry = self._writable(op["key"])
+        file_ = op["file"]
+        if not os.path.isfile(file_):
+            raise click.ClickException("{} doesn't exist".format(file_))
+        if op.get("no_copy"):
+            entry["fields"]["file"] = os.path.abspath(file_)
+            return
+        destination = op.get("destination") or self._default_destination()
+        path = internals.file_destination(entry, file_, destination)
+        if os.path.exists(path) or path in self.file_copies:
+            raise click.ClickException("{} already exists".format(path))
+        link = op.get("link", "copy")
+        if link not in files.LINK_STRATEGIES:
+            raise click.ClickException('Unknown link "{}"'.format(link))
+        self.file_copies[path] = (file_, link)
+        entry["fields"]["file"] = path
+
+    def commit(self):
+        for path, (file_, link) in self.file_copies.items():
+            internals.place_file(file_, path, link)
+        self.data[:] = [e for e in self.entries if e is not None]
+
+    def _position(self, key):
+        try:
+            return self.index[key]
+        except KeyError:
+            raise click.ClickException('Couldn\'t find "{}"'.format(key))
+
+    def _writable(self, key):
+        """
+        Return the entry, copied to the working copy if not done already.
+        """
+        i = self._position(key)
+        if i not in self.copied:
+            entry = self.entries[i]
+            self.entries[i] = dict(entry, fields=entry["fields"].copy())
+            self.copied.add(i)
+        return self.entries[i]
+
+    def _unique_key_validation(self, key):
+        if key in self.index:
+            raise click.ClickException('Duplicate key "{}"'.format(key))
+
+    def _default_destination(self):
+        # The heuristic runs over the original data, and only once
+        if self._destination is None:
+            self._destination = internals.destination_heuristic(self.data)
+        return self._destination
@@ -3,18 +3,37 @@ Command line reference manager with a single source of truth: the .bib file.
 Inspired by beets.
 """
 
+import itertools
+
 import click
 import click_constraints
-import click_plugins  # type: ignore
 import pybibs
-import pylatexenc.latex2text  # type: ignore
-import pyperclip  # type: ignore
-import requests
 
-from . import cite
 from . import internals
 from . import query
 
+LINK_OPTION = click.option(
+    "--link",
+    type=click.Choice(["hard", "reflink", "copy"]),
+    default="copy",
+    show_default=True,
+    help="""
+How to put the file in its folder: as a hard link, as a copy-on-write clone
+(on file systems that support it), or as a copy.
+Falls back to the next option when one fails.
+""",
+)
+STORE_OPTION = click.option(
+    "--store",
+    envvar=internals.BIBO_FILE_STORE_ENV_VAR,
+    help="""
+A folder to keep one copy of every file, by content.
+A file that is already stored is linked from there instead of being written
+again (use with ``--link hard`` or ``reflink``).
+Overrides the BIBO_FILE_STORE environment variable.
+""",
+    type=click.Path(file_okay=False, dir_okay=True, writable=True),
+)
 FILE_OPTIONS = internals.combine_decorators(
     [
         click.option(
@@ -32,6 +51,8 @@ FILE_OPTIONS = internals.combine_decorators(
             help="Add the specified file in its current location without copying.",
             is_flag=True,
         ),
+        LINK_OPTION,
+        STORE_OPTION,
         click_constraints.constrain("destination", depends=["file"]),
         click_constraints.constrain(
             "no_copy",
@@ -40,6 +61,8 @@ FILE_OPTIONS = internals.combine_decorators(
         ),
     ]
 )
+FIRST_CITATION_BATCH_SIZE = 20
+OUTPUT_BATCH_SIZE = 1000
 SEARCH_TERMS_OPTION = click.argument(
     "search_term",
     nargs=-1,
@@ -47,8 +70,7 @@ SEARCH_TERMS_OPTION = click.argument(
 )
 
 
-@click_plugins.with_plugins(internals.get_plugins())
-@click.group(help=__doc__)
+@click.group(cls=internals.PluginGroup, help=__doc__)
 @click.version_option()
 @click.option(
     "--database",
@@ -68,8 +90,10 @@ A path to a .bib file. Overrides the BIBO_DATABASE environment variable.
 @click.pass_context
 def cli(ctx, database):
     ctx.ensure_object(dict)
+    # Long-running callers (e.g. `bibo serve`) provide the loaded database
+    if ctx.obj.get("database") != database or "data" not in ctx.obj:
+        ctx.obj["data"], ctx.obj["fingerprint"] = internals.read_database(database)
     ctx.obj["database"] = database
-    ctx.obj["data"] = internals.load_database(database)
 
 
 @cli.command("list", short_help="List entries.")
@@ -91,9 +115,23 @@ For example: ``--format '$author ($year) - $title'``.
 """,
 )
 @click.option("--verbose", is_flag=True, help="Show verbose information.")
+@click.option(
+    "--sort",
+    metavar="FIELD[,FIELD...]",
+    help="""
+Sort by one or more fields, for example ``--sort year,author``.
+Years are sorted as numbers, and authors by the last name of the first
+author.
+""",
+)
+@click.option("--reverse", is_flag=True, help="Reverse the sort order.")
+@click.option(
+    "--limit", type=click.IntRange(0), help="Show at most this number of entries."
+)
+@click_constraints.constrain("reverse", depends=["sort"])
 @SEARCH_TERMS_OPTION
 @click.pass_context
-def list_(ctx, search_term, raw, bibstyle, verbose, **kwargs):
+def list_(ctx, search_term, raw, bibstyle, verbose, sort, reverse, limit, **kwargs):
     """
     List entries in the database.
 
@@ -102,59 +140,94 @@ def list_(ctx, search_term, raw, bibstyle, verbose, **kwargs):
     If multiple search terms are provided an entry should match all of them.
     It is possible to match against a specific key, type, or field as
     follows: ``author:einstein``, ``year:2018`` or ``type:book``.
+    Use ``fulltext:term`` to match the text of the linked files, after
+    indexing them with ``bibo index``.
     Note that search terms are case insensitive.
     """
 
     format_pattern = kwargs.pop("format")
     assert not kwargs
 
-    results = query.search(ctx.obj["data"], search_term)
+    results = _search(ctx, search_term)
+    if sort:
+        fields = [f.strip().lower() for f in sort.split(",") if f.strip()]
+        results = query.sort(results, fields, reverse, limit)
+    elif limit is not None:
+        results = itertools.islice(results, limit)
     if raw:
         _list_raw((r.entry for r in results))
     elif format_pattern:
         _list_format_pattern((r.entry for r in results), format_pattern)
     else:
-        _list_citations(results, ctx.obj["database"], bibstyle, verbose)
+        _list_citations(
+            results, ctx.obj["database"], bibstyle, verbose, ctx.obj["data"]
+        )
+
+
+def _search(ctx, search_term):
+    """
+    `query.search` the database, with the full-text index if needed, and
+    the folded values of long-running callers (e.g. `bibo serve`).
+    """
+    fulltext = None
+    if any(query.is_fulltext_term(t) for t in search_term):
+        from . import fulltext as fulltext_module
+
+        fulltext = fulltext_module.open_index(ctx.obj["database"]).text
+    texts = ctx.obj.get("search_texts")
+    return query.search(ctx.obj["data"], search_term, fulltext, texts)
 
 
 def _list_raw(entries):
-    for entry in entries:
-        click.echo(pybibs.write_string([entry]))
+    _echo_lines(pybibs.write_string([entry]) for entry in entries)
 
 
 def _list_format_pattern(entries, format_pattern):
-    for entry in entries:
-        click.echo(internals.format_entry(entry, format_pattern))
+    format_ = internals.compile_format(format_pattern)
+    _echo_lines(format_(entry) for entry in entries)
 
 
-def _list_citations(results, database, bibstyle, verbose):
-    results = list(results)
-    keys = [r.entry["key"] for r in results]
-    exception = None
-    try:
-        citations = cite.cite(keys, database, bibstyle, verbose)
-    except cite.BibtexException as e:
-        exception = e
+def _echo_lines(lines):
+    """
+    Echo `lines` in batches, instead of a (slow) `click.echo` per line.
+    """
+    lines = iter(lines)
+    while True:
+        batch = list(itertools.islice(lines, OUTPUT_BATCH_SIZE))
+        if not batch:
+            return
+        click.echo("\n".join(batch))
 
-    latex_converter = pylatexenc.latex2text.LatexNodes2Text()
 
-    for result in results:
-        header = internals.header(result.entry)
-        if exception:
-            citation = cite.fallback(result.entry)
-        else:
-            citation = citations[result.entry["key"]]
+def _list_citations(results, database, bibstyle, verbose, data=None):
+    from . import cite
 
-        citation = latex_converter.latex_to_text(citation)
-        text = "\n".join([header, citation])
-        text, extra_match_info = internals.highlight_match(text, result)
+    exception = None
+    for batch in _citation_batches(results, bibstyle, data):
+        if exception is None:
+            keys = [r.entry["key"] for r in batch]
+            try:
+                citations = cite.cite(keys, database, bibstyle, verbose, data)
+            except cite.BibtexException as e:
+                exception = e
+
+        for result in batch:
+            header = internals.header(result.entry)
+            if exception:
+                citation = cite.fallback(result.entry)
+            else:
+                citation = citations[result.entry["key"]]
+
+            citation = internals.latex_to_text(citation)
+            text = "\n".join([header, citation])
+            text, extra_match_info = internals.highlight_match(text, result)
 
-        click.echo(text)
+            click.echo(text)
 
-        if extra_match_info:
-            click.secho("Search matched by", underline=True)
-        for key, val in extra_match_info.items():
-            click.echo(f"{key}: {latex_converter.latex_to_text(val)}")
+            if extra_match_info:
+                click.secho("Search matched by", underline=True)
+            for key, val in extra_match_info.items():
+                click.echo(f"{key}: {internals.latex_to_text(val)}")
 
     if exception is not None:
         parts = [str(exception), "Using a fallback citation method"]
@@ -163,6 +236,89 @@ def _list_citations(results, database, bibstyle, verbose):
         click.secho(". ".join(parts), fg="red")
 
 
+def _citation_batches(results, bibstyle, data):
+    """
+    Split `results` into batches of growing size, so the first entries are
+    printed while the rest are still being searched and cited.
+    Everything is a single batch if citations depend on each other.
+    """
+    from . import cite
+
+    if data is None or not cite.is_independent(bibstyle, data):
+        yield list(results)
+        return
+    size = FIRST_CITATION_BATCH_SIZE
+    results = iter(results)
+    while True:
+        batch = list(itertools.islice(results, size))
+        if not batch:
+            return
+        yield batch
+        size *= 2
+
+
+@cli.command(short_help="Show statistics of entries.")
+@click.option("--json", "as_json", is_flag=True, help="Format as JSON.")
+@click.option(
+    "--top",
+    type=click.IntRange(1),
+    default=10,
+    show_default=True,
+    help="Number of authors to show.",
+)
+@SEARCH_TERMS_OPTION
+@click.pass_context
+def stats(ctx, search_term, as_json, top):
+    """
+    Count entries by type, year, and tag, and find the authors with the most
+    entries.
+    Authors are counted by last name and first initial.
+
+    Use the same SEARCH_TERMs as in ``list`` to select entries.
+    """
+    from . import stats as stats_module
+
+    entries = (r.entry for r in _search(ctx, search_term))
+    result = stats_module.stats(entries, top)
+    if as_json:
+        import json
+
+        click.echo(json.dumps(result, indent=2))
+    else:
+        click.echo(stats_module.format_text(result))
+
+
+@cli.command(short_help="Export entries as JSON.")
+@click.option(
+    "--to",
+    "format_",
+    type=click.Choice(["json", "ndjson", "csl-json"]),
+    default="json",
+    show_default=True,
+    help="""
+Output format: a JSON array of entries as parsed from the database, one
+entry per line (newline delimited JSON), or CSL-JSON for citation tools.
+""",
+)
+@click.option(
+    "--output",
+    type=click.File("w", encoding="utf-8", lazy=True),
+    default="-",
+    help="A file to write to, instead of the standard output.",
+)
+@SEARCH_TERMS_OPTION
+@click.pass_context
+def export(ctx, search_term, format_, output):
+    """
+    Export the entries that match the SEARCH_TERMs (all entries by
+    default), streaming them one by one.
+    """
+    from . import export as export_module
+
+    entries = (r.entry for r in _search(ctx, search_term))
+    export_module.write(entries, output, format_)
+
+
 @cli.command("open", short_help="Open the file, URL, or doi associated with an entry.")
 @SEARCH_TERMS_OPTION
 @click.pass_context
@@ -203,8 +359,17 @@ def open_(ctx, search_term):
 @cli.command(short_help="Add a new entry.")
 @FILE_OPTIONS
 @click.option("--doi", help="Add entry by DOI.")
+@click.option(
+    "--doi-file",
+    type=click.File("r"),
+    help="""
+Add entries by the DOIs listed in a file (one per line, ``-`` for stdin),
+without opening the editor.
+""",
+)
+@click_constraints.constrain("doi_file", conflicts=["doi", "file"])
 @click.pass_context
-def add(ctx, destination, doi, no_copy, **kwargs):
+def add(ctx, destination, doi, doi_file, no_copy, link, store, **kwargs):
     """
     Add a new entry to the database.
 
@@ -215,29 +380,175 @@ def add(ctx, destination, doi, no_copy, **kwargs):
 
     Don't forget to set the EDITOR environment variable for this command
     to work properly.
+
+    With ``--doi-file`` the entries are fetched concurrently and added
+    as is. DOIs that are already in the database are skipped, and keys that
+    are taken get a letter suffix.
     """
     file_ = kwargs.pop("file")
 
+    if doi_file is not None:
+        _add_dois(ctx, doi_file)
+        return
+
     data = ctx.obj["data"]
     if doi is not None:
-        url = "http://dx.doi.org/{}".format(doi)
-        headers = {"Accept": "application/x-bibtex"}
-        resp = requests.get(url, headers=headers)
-        assert resp.status_code == 200
-        raw_bib = resp.text
+        from . import doi as doi_module
+
+        cache = doi_module.default_cache()
+        raw_bib = doi_module.fetch(doi, cache=cache)
+        cache.evict()
     else:
+        import pyperclip  # type: ignore
+
         raw_bib = pyperclip.paste()
     bib = internals.editor(text=raw_bib)
     entry = pybibs.read_entry_string(bib)
 
     internals.unique_key_validation(entry["key"], data)
 
+    if file_:
+        internals.set_file(data, entry, file_, destination, no_copy, link, store)
+
     data.append(entry)
 
-    if file_:
-        internals.set_file(data, entry, file_, destination, no_copy)
+    def merge(current):
+        internals.unique_key_validation(entry["key"], current)
+        current.append(entry)
+
+    internals.write_database(ctx.obj, merge)
+
+
+def _add_dois(ctx, lines):
+    from . import doi as doi_module
+
+    data = ctx.obj["data"]
+    entries = list(internals.bib_entries(data))
+    seen = set(
+        internals.normalise_doi(e["fields"]["doi"])
+        for e in entries
+        if e["fields"].get("doi")
+    )
+    keys = set(e["key"] for e in entries)
+
+    dois = []
+    for line in lines:
+        doi = internals.normalise_doi(line)
+        if not doi or doi.startswith("#"):
+            continue
+        if doi in seen:
+            click.echo("Skipping {}: already in the database".format(doi))
+            continue
+        seen.add(doi)
+        dois.append(doi)
+
+    new_entries = []
+    failures = []
+    cache = doi_module.default_cache()
+    for doi, raw_bib in doi_module.fetch_many(dois, cache=cache):
+        if isinstance(raw_bib, doi_module.DOIError):
+            failures.append(raw_bib.message)
+            continue
+        try:
+            entry = pybibs.read_entry_string(raw_bib)
+            entry["fields"].setdefault("doi", doi)
+        except Exception:
+            failures.append("Invalid BibTeX for {}".format(doi))
+            continue
+        key = internals.unique_key(entry["key"], keys)
+        if key != entry["key"]:
+            click.echo('Renaming {} to "{}": duplicate key'.format(doi, key))
+            entry["key"] = key
+        keys.add(key)
+        new_entries.append(entry)
+
+    if new_entries:
+        data.extend(new_entries)
+        internals.write_database(ctx.obj)
+    click.echo("Added {} entries".format(len(new_entries)))
+
+    for failure in failures:
+        click.secho(failure, fg="red", err=True)
+    if failures:
+        raise click.ClickException("{} DOIs couldn't be added".format(len(failures)))
+
+
+@cli.command("import", short_help="Import entries from .bib files.")
+@click.argument(
+    "files",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, readable=True, dir_okay=False),
+)
+@click.option(
+    "--on-conflict",
+    type=click.Choice(["skip", "rename", "overwrite"]),
+    default="skip",
+    show_default=True,
+    help="""
+What to do with an entry that has a key that is already taken, or that is
+a duplicate of an existing entry (by DOI, or by title and year).
+``rename`` skips duplicates, and ``overwrite`` keeps the existing key.
+An @string with a different value than an existing one is skipped, unless
+overwritten. @preamble entries are skipped.
+""",
+)
+@click.pass_context
+def import_(ctx, files, on_conflict):
+    """
+    Import all entries from FILES into the database, in a single write.
+    Every conflict is reported.
+    """
+    from . import merge
+
+    # Parse everything first, so a bad file leaves the data untouched
+    entries = []
+    for file_ in files:
+        with open(file_) as f:
+            content = f.read()
+        try:
+            entries.extend(pybibs.iter_string(content))
+        except (AssertionError, IndexError, ValueError):
+            raise click.ClickException("Failed to parse {}".format(file_))
+
+    m = merge.Merge(ctx.obj["data"], on_conflict)
+    for entry in entries:
+        m.add(entry)
+
+    if m.counts["added"] or m.counts["renamed"] or m.counts["overwritten"]:
+        internals.write_database(ctx.obj)
+    summary = ", ".join(
+        "{} {}".format(m.counts[k], k)
+        for k in ["added", "renamed", "overwritten", "skipped"]
+    )
+    click.echo(summary.capitalize())
+
+
+@cli.command(short_help="Find near-duplicate entries.")
+@click.option(
+    "--threshold",
+    type=click.FloatRange(0, 1),
+    default=0.8,
+    show_default=True,
+    help="Minimal similarity of the titles and authors of duplicates.",
+)
+@click.pass_context
+def dedupe(ctx, threshold):
+    """
+    List clusters of entries with similar titles and authors, ignoring case,
+    accents, LaTeX markup, and author first names.
+    Each cluster starts with its first entry in the database, followed by
+    the other entries and their similarity to it.
+    """
+    from . import dedupe as dedupe_module
 
-    pybibs.write_file(data, ctx.obj["database"])
+    for i, cluster in enumerate(dedupe_module.clusters(ctx.obj["data"], threshold)):
+        if i:
+            click.echo()
+        (first, _), *others = cluster
+        click.echo(first["key"])
+        for entry, score in others:
+            click.echo("  {:.2f} {}".format(score, entry["key"]))
 
 
 @cli.command(short_help="Remove an entry or a field.")
@@ -252,20 +563,26 @@ def remove(ctx, key, field):
     To fields specify the key and list all fields for removal.
     """
     data = ctx.obj["data"]
-    entry = query.get_by_key(data, key)
+    entry = query.get_by_key(data, key, ctx.obj.get("keys"))
 
-    if not field:
-        data.remove(entry)
-    elif "fields" in entry:
-        for f in field:
-            if f in entry["fields"]:
-                del entry["fields"][f]
-            else:
-                click.echo('"{}" has no field "{}"'.format(key, f))
-    else:
+    if field and "fields" not in entry:
         click.echo('"{}" has no fields'.format(key))
+    for f in field:
+        if "fields" in entry and f not in entry["fields"]:
+            click.echo('"{}" has no field "{}"'.format(key, f))
+
+    def merge(current):
+        _remove(current, query.get_by_key(current, key), field)
 
-    pybibs.write_file(data, ctx.obj["database"])
+    _remove(data, entry, field)
+    internals.write_database(ctx.obj, merge)
+
+
+def _remove(data, entry, fields):
+    if not fields:
+        data.remove(entry)
+    for f in fields:
+        entry.get("fields", {}).pop(f, None)
 
 
 @cli.command(short_help="Edit an entry.")
@@ -273,7 +590,7 @@ def remove(ctx, key, field):
 @click.argument("field_value", nargs=-1)
 @FILE_OPTIONS
 @click.pass_context
-def edit(ctx, key, field_value, destination, no_copy, **kwargs):
+def edit(ctx, key, field_value, destination, no_copy, link, store, **kwargs):
     """
     Edit an entry.
 
@@ -288,10 +605,10 @@ def edit(ctx, key, field_value, destination, no_copy, **kwargs):
     file_ = kwargs.pop("file")
 
     data = ctx.obj["data"]
-    entry = query.get_by_key(data, key)
+    entry = query.get_by_key(data, key, ctx.obj.get("keys"))
 
-    if file_:
-        internals.set_file(data, entry, file_, destination, no_copy)
+    # Collect and validate all changes before changing anything
+    changes = []
     for fv in field_value:
         if "=" in fv:
             field, value = fv.split("=")
@@ -301,13 +618,228 @@ def edit(ctx, key, field_value, destination, no_copy, **kwargs):
             value = internals.editor(text=current_value).strip()
         if field == "key":
             internals.unique_key_validation(value, data)
-            entry["key"] = value
-        elif field == "type":
-            entry["type"] = value
+        changes.append((field, value))
+
+    if file_:
+        internals.set_file(data, entry, file_, destination, no_copy, link, store)
+        changes.append(("file", entry["fields"]["file"]))
+    _apply_changes(entry, changes)
+
+    def merge(current):
+        # Someone else changed the database, edit the entry as it is now
+        for field, value in changes:
+            if field == "key":
+                internals.unique_key_validation(value, current)
+        _apply_changes(query.get_by_key(current, key), changes)
+
+    internals.write_database(ctx.obj, merge)
+
+
+def _apply_changes(entry, changes):
+    for field, value in changes:
+        if field in ["key", "type"]:
+            entry[field] = value
         else:
             entry["fields"][field] = value
 
-    pybibs.write_file(data, ctx.obj["database"])
+
+@cli.command(short_help="Attach many files at once.")
+@click.argument(
+    "files", nargs=-1, type=click.Path(exists=True, readable=True, dir_okay=False)
+)
+@click.option(
+    "--csv",
+    "csv_file",
+    type=click.File("r"),
+    help="A CSV file with KEY,FILE rows (``-`` for stdin).",
+)
+@click.option(
+    "--destination",
+    help="A folder to put the files in.",
+    type=click.Path(exists=True, readable=True, dir_okay=True, file_okay=False),
+)
+@LINK_OPTION
+@STORE_OPTION
+@click.pass_context
+def attach(ctx, files, csv_file, destination, link, store):
+    """
+    Attach files to entries, and write the database once.
+
+    Each of FILES is attached to the entry whose key matches its name, e.g.
+    ``tolkien1937hobit.pdf``, ignoring case and punctuation.
+    Alternatively, list the key and file of every entry in a CSV file.
+    Files are copied concurrently.
+    """
+    from . import attach as attach_module
+
+    if bool(files) == bool(csv_file):
+        raise click.UsageError("Specify either FILES or --csv")
+
+    data = ctx.obj["data"]
+    if csv_file:
+        pairs = attach_module.read_csv(csv_file)
+    else:
+        pairs = attach_module.match_files(data, files)
+    if not destination:
+        destination = internals.destination_heuristic(data)
+
+    jobs, errors = attach_module.plan(data, pairs, destination)
+    placed, place_errors = attach_module.place_all(jobs, link, store)
+    errors += place_errors
+
+    if placed:
+        internals.write_database(ctx.obj)
+    click.echo("Attached {} files".format(placed))
+
+    for error in errors:
+        click.secho(error, fg="red", err=True)
+    if errors:
+        raise click.ClickException("{} files couldn't be attached".format(len(errors)))
+
+
+@cli.command("check-files", short_help="Check the files linked to entries.")
+@click.option(
+    "--record",
+    is_flag=True,
+    help="""
+Record the size and SHA-256 hash of every file in its entry, so the next
+checks don't have to read the files again.
+""",
+)
+@click.pass_context
+def check_files(ctx, record):
+    """
+    Check that the files linked to entries exist and are readable, and find
+    different files with the same content.
+    Files are checked concurrently.
+    With recorded sizes, files whose size changed are reported too.
+    """
+    from . import check
+
+    problems, recorded = check.check(ctx.obj["data"], record)
+    for problem in problems:
+        described = ", ".join(
+            '"{}" ({})'.format(e["key"], e["fields"]["file"]) for e in problem.entries
+        )
+        click.echo("{}: {}".format(_PROBLEM_DESCRIPTIONS[problem.kind], described))
+    if recorded:
+        internals.write_database(ctx.obj)
+        click.echo("Recorded {} files".format(recorded))
+    if problems:
+        raise click.ClickException("{} problems found".format(len(problems)))
+
+
+_PROBLEM_DESCRIPTIONS = {
+    "missing": "Missing file",
+    "unreadable": "Unreadable file",
+    "changed": "Changed since recorded",
+    "duplicate": "Same content",
+}
+
+
+@cli.command("index", short_help="Index the text of the linked files.")
+@click.option(
+    "--workers",
+    type=click.IntRange(1),
+    help="Number of processes to extract text with. Defaults to the number of CPUs.",
+)
+@click.pass_context
+def index(ctx, workers):
+    """
+    Build or update the full-text index of the files linked to entries, for
+    searching them with ``bibo list fulltext:term``.
+    Only new and changed files are read.
+
+    Plain text files are supported out of the box.
+    Other file types, like PDF, are supported by extractor plugins.
+    """
+    from . import fulltext
+
+    index_ = fulltext.Index(ctx.obj["database"])
+    try:
+        count, errors = index_.update(ctx.obj["data"], workers)
+    finally:
+        index_.close()
+    click.echo("Indexed {} files".format(count))
+    for error in errors:
+        click.secho(error, fg="red", err=True)
+
+
+@cli.command(short_help="Apply many changes at once.")
+@click.argument("operations", type=click.File("r"), default="-")
+@click.pass_context
+def batch(ctx, operations):
+    """
+    Apply the operations listed in the OPERATIONS file (stdin by default)
+    and write the database once.
+    Either all the operations are applied, or none of them.
+
+    Every line is an operation, either in the following format
+
+    \b
+        add @article{key, title={Title}}
+        edit KEY FIELD=VALUE [FIELD=VALUE ...]
+        remove KEY [FIELD ...]
+        set-file KEY FILE [--destination FOLDER] [--no-copy] [--link HOW]
+
+    or as a JSON object, for example
+    ``{"op": "edit", "key": "KEY", "fields": {"year": "1937"}}``.
+    The JSON items follow the names above: ``entry`` for ``add``, ``fields``
+    for ``edit`` and ``remove``, and ``file``, ``destination``, ``no_copy``,
+    and ``link`` for ``set-file``.
+    Empty lines and lines starting with ``#`` are ignored.
+    """
+    from . import batch as batch_module
+
+    count = batch_module.apply(ctx.obj["data"], batch_module.parse(operations))
+    internals.write_database(ctx.obj)
+    click.echo("Applied {} operations".format(count))
+
+
+@cli.command(short_help="Run commands interactively.")
+@click.option(
+    "--autosave",
+    type=float,
+    metavar="SECONDS",
+    help="Save changes after SECONDS without further changes.",
+)
+@click.pass_context
+def shell(ctx, autosave):
+    """
+    Run bibo commands interactively, e.g. ``list tolkien`` or
+    ``edit KEY year=1937``, with history and auto-complete.
+
+    The database is loaded once for the entire session.
+    Changes are written to it on ``save`` and ``exit``, or after
+    ``--autosave`` seconds without further changes.
+    """
+    from . import shell as shell_module
+
+    shell_module.Shell(cli, ctx.obj["database"], ctx.obj["data"], autosave).cmdloop()
+
+
+@cli.command(short_help="Serve bibo commands from a background process.")
+@click.pass_context
+def serve(ctx):
+    """
+    Keep the database loaded in a long-running process that serves the
+    ``list``, ``open``, ``edit``, and auto-complete commands over a local
+    Unix socket.
+
+    While it is running, bibo uses it transparently for these commands.
+    Changes to the database on disk are picked up as they happen, parsing
+    only the entries that changed.
+    Stop with Ctrl+C.
+    """
+    from . import daemon
+
+    daemon.exit_on_sigterm()
+    with daemon.Server(ctx.obj["database"], ctx.obj["data"]) as server:
+        click.echo("Serving {} on {}".format(ctx.obj["database"], server.path))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+"""
+Check the files linked to entries.
+"""
+
+import collections
+import concurrent.futures
+import os
+import stat
+
+from . import files
+from . import internals
+
+# Stat and hash calls mostly wait for the disk or the network
+WORKERS = 32
+SIZE_FIELD = "filesize"
+HASH_FIELD = "filehash"
+
+Problem = collections.namedtuple("Problem", ["kind", "entries"])
+
+
+def check(data, record=False, workers=WORKERS):
+    """
+    Check the file of every entry in `data`, concurrently, and find
+    `Problem`s, each with a kind and the entries it is about:
+
+    - ``missing``: the file doesn't exist.
+    - ``unreadable``: the file can't be read.
+    - ``changed``: the size of the file differs from the recorded one.
+    - ``duplicate``: different files with the same content (hard links to
+      the same file are fine).
+
+    Only files with the same size as another file are hashed, unless
+    `record` is set, in which case every file is hashed and its size and
+    hash are recorded in the entry.
+    A recorded hash is trusted as long as the size of the file is unchanged,
+    so that the next check doesn't read the file again.
+    Return the problems and the number of entries changed by `record`.
+    """
+    entries = [e for e in internals.bib_entries(data) if e["fields"].get("file")]
+    paths = [e["fields"]["file"] for e in entries]
+    problems = []
+    by_inode = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for entry, st in zip(entries, executor.map(_stat, paths)):
+            if isinstance(st, str):
+                problems.append(Problem(st, [entry]))
+                continue
+            # Each file once, even if several entries link to it
+            linked = by_inode.get((st.st_dev, st.st_ino))
+            if linked is None:
+                linked = _LinkedFile(entry["fields"]["file"], st)
+                by_inode[st.st_dev, st.st_ino] = linked
+            linked.entries.append(entry)
+            recorded_size = entry["fields"].get(SIZE_FIELD)
+            if recorded_size is not None and recorded_size != str(st.st_size):
+                problems.append(Problem("changed", [entry]))
+            elif recorded_size is not None and entry["fields"].get(HASH_FIELD):
+                linked.digest = entry["fields"][HASH_FIELD]
+
+        linked_files = list(by_inode.values())
+        sizes = collections.Counter(f.stat.st_size for f in linked_files)
+        to_hash = [
+            f
+            for f in linked_files
+            if f.digest is None and (record or sizes[f.stat.st_size] > 1)
+        ]
+        for f, digest in zip(to_hash, executor.map(_hash, [f.path for f in to_hash])):
+            if digest is None:
+                problems.append(Problem("unreadable", f.entries))
+            f.digest = digest
+
+    by_digest = collections.defaultdict(list)
+    for f in linked_files:
+        if f.digest is not None:
+            by_digest[f.digest].append(f)
+    for same in by_digest.values():
+        if len(same) > 1:
+            problems.append(Problem("duplicate", [e for f in same for e in f.entries]))
+
+    recorded = 0
+    if record:
+        for f in linked_files:
+            if f.digest is not None:
+                for entry in f.entries:
+                    recorded += _record(entry, f.stat.st_size, f.digest)
+    return problems, recorded
+
+
+class _LinkedFile:
+    def __init__(self, path, st):
+        self.path = path
+        self.stat = st
+        self.entries = []
+        self.digest = None
+
+
+def _stat(path):
+    """
+    Return the stat result of `path`, or the kind of problem with it.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "missing"
+    except OSError:
+        return "unreadable"
+    if not stat.S_ISREG(st.st_mode):
+        return "missing"
+    if not os.access(path, os.R_OK):
+        return "unreadable"
+    return st
+
+
+def _hash(path):
+    try:
+        return files.file_hash(path)
+    except OSError:
+        return None
+
+
+def _record(entry, size, digest):
+    fields = entry["fields"]
+    if fields.get(SIZE_FIELD) == str(size) and fields.get(HASH_FIELD) == digest:
+        return 0
+    fields[SIZE_FIELD] = str(size)
+    fields[HASH_FIELD] = digest
+    return 1
@@ -1,10 +1,25 @@
 from __future__ import print_function
 
+import atexit
+import collections
+import concurrent.futures
 import os
 import re
+import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+
+import pybibs
+
+# Minimum number of keys per bibtex run when sharding
+SHARD_SIZE = 500
+# Styles that format every entry on its own, whatever else is cited
+INDEPENDENT_STYLES = frozenset(["plain", "unsrt", "abbrv", "ieeetr", "acm", "siam"])
+
+_workspace = None
+_workspace_lock = threading.Lock()
 
 
 class BibtexException(Exception):
@@ -13,13 +28,133 @@ class BibtexException(Exception):
         self.use_verbose = use_verbose
 
 
-def cite(keys, database, bibstyle="plain", verbose=False):
+def cite(keys, database, bibstyle="plain", verbose=False, data=None):
+    """
+    Format citations for `keys` with bibtex.
+
+    When the already parsed `data` is given, bibtex is fed with a minimal
+    database holding only what is needed for `keys`, instead of the entire
+    `database` file. Large sets of `keys` are then split into shards that
+    are formatted by concurrent bibtex runs, unless the style, or crossrefs,
+    make one citation depend on the others.
+    """
     if not keys:
         return {}
-    aux_filepath = _write_aux_file(keys, database, bibstyle)
-    _bibtex(aux_filepath, verbose)
-    bbl_filepath = aux_filepath.replace(".aux", ".bbl")
-    return _parse_bbl(bbl_filepath)
+    if (
+        data is not None
+        and len(keys) > SHARD_SIZE
+        and _is_shardable(bibstyle)
+        and not _has_crossrefs(keys, data)
+    ):
+        return _cite_sharded(keys, database, bibstyle, verbose, data)
+    return _cite(keys, database, bibstyle, verbose, data)
+
+
+def _cite(keys, database, bibstyle, verbose, data):
+    run_dir = tempfile.mkdtemp(dir=workspace())
+    try:
+        aux_filepath = _write_aux_file(keys, database, bibstyle, data, run_dir)
+        _bibtex(aux_filepath, verbose)
+        bbl_filepath = aux_filepath.replace(".aux", ".bbl")
+        return _parse_bbl(bbl_filepath)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def workspace():
+    """
+    Return the scratch folder for bibtex runs, created on first use and
+    reused for the rest of the process. Every run works in its own
+    sub-folder, which is removed as soon as the run is over.
+    """
+    global _workspace
+    with _workspace_lock:
+        if _workspace is None or not os.path.isdir(_workspace):
+            _workspace = tempfile.mkdtemp(prefix="bibo-", dir=_scratch_root())
+        return _workspace
+
+
+@atexit.register
+def cleanup():
+    """
+    Remove the scratch folder.
+    """
+    global _workspace
+    with _workspace_lock:
+        if _workspace is not None:
+            shutil.rmtree(_workspace, ignore_errors=True)
+            _workspace = None
+
+
+def _scratch_root():
+    """
+    Prefer a memory backed file system (tmpfs) for scratch files.
+    `None` means the system default temp folder.
+    """
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK | os.X_OK):
+        return shm
+    return None
+
+
+def _cite_sharded(keys, database, bibstyle, verbose, data):
+    shards = _shards(keys, os.cpu_count() or 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        futures = [
+            pool.submit(_cite, shard, database, bibstyle, verbose, data)
+            for shard in shards
+        ]
+        merged = {}
+        for future in futures:
+            merged.update(future.result())
+    ordered = {key: merged.pop(key) for key in keys if key in merged}
+    ordered.update(merged)
+    return ordered
+
+
+def _shards(keys, workers):
+    """
+    Split `keys` into at most `workers` contiguous shards of at least
+    `SHARD_SIZE` keys each.
+    """
+    count = max(1, min(workers, len(keys) // SHARD_SIZE))
+    size = -(-len(keys) // count)  # Ceiling division
+    return [keys[i : i + size] for i in range(0, len(keys), size)]
+
+
+def _is_shardable(bibstyle):
+    """
+    Whether citations in `bibstyle` are independent of each other.
+    Many styles keep state from one entry to the next, e.g. to disambiguate
+    labels (``alpha``, or author-year styles with "2018a"), or to replace
+    repeated author names (``\\bysame`` in the AMS styles, dashes in
+    IEEEtran), so only standard styles known to have no such state are.
+    """
+    return bibstyle in INDEPENDENT_STYLES
+
+
+def is_independent(bibstyle, data):
+    """
+    Whether citing a group of entries from `data` gives the same result as
+    citing each of them separately.
+    """
+    return _is_shardable(bibstyle) and not any(
+        "crossref" in e.get("fields", {}) for e in data
+    )
+
+
+def _has_crossrefs(keys, data):
+    """
+    Whether any of the entries cited by `keys` crossref another entry.
+    bibtex formats those depending on how many entries share the parent.
+    """
+    keys = set(k.lower() for k in keys)
+    for entry in data:
+        if entry.get("key", "").lower() in keys and "crossref" in entry.get(
+            "fields", {}
+        ):
+            return True
+    return False
 
 
 def fallback(entry):
@@ -35,29 +170,119 @@ def fallback(entry):
     return entry["type"]
 
 
-def _write_aux_file(keys, database, bibstyle):
-    auxfile = tempfile.NamedTemporaryFile("w", suffix=".aux", delete=False)
-    with auxfile as f:
+def _write_aux_file(keys, database, bibstyle, data, directory):
+    aux_filepath = os.path.join(directory, "cite.aux")
+    if data is not None:
+        database = _write_subset_file(keys, data, aux_filepath)
+    with open(aux_filepath, "w") as f:
         print(r"\bibdata{{{}}}".format(database), file=f)
         print(r"\bibstyle{{{}}}".format(bibstyle), file=f)
         for key in keys:
             line = r"\citation{{{}}}".format(key)
             print(line, file=f)
 
-    return auxfile.name
+    return aux_filepath
+
+
+def _write_subset_file(keys, data, aux_filepath):
+    """
+    Write the subset of `data` needed to cite `keys` next to the .aux file.
+    Return the path to the new .bib file.
+    """
+    bib_filepath = aux_filepath.replace(".aux", ".bib")
+    with open(bib_filepath, "w") as f:
+        f.write(pybibs.write_string(_subset(keys, data)))
+    return bib_filepath
+
+
+def _subset(keys, data):
+    """
+    Return the entries of `data` bibtex needs to cite `keys`: all @string and
+    @preamble entries, the cited entries, and the entries they crossref.
+    Every crossref target is placed after all the entries that crossref it,
+    as bibtex requires, even if it is cited itself.
+    """
+    by_key = {}
+    preliminaries = []
+    for entry in data:
+        type_ = entry["type"].lower()
+        if type_ in ["string", "preamble"]:
+            preliminaries.append(entry)
+        elif type_ != "comment":
+            by_key.setdefault(entry["key"].lower(), entry)
+
+    cited = []
+    seen = set()
+    for key in keys:
+        entry = by_key.get(key.lower())
+        if entry is not None and key.lower() not in seen:
+            seen.add(key.lower())
+            cited.append(entry)
+
+    crossrefs = []
+    pending = cited
+    while pending:
+        parents = []
+        for entry in pending:
+            parent_key = _crossref(entry)
+            parent = by_key.get(parent_key)
+            if parent is not None and parent_key not in seen:
+                seen.add(parent_key)
+                parents.append(parent)
+        crossrefs.extend(parents)
+        pending = parents
+
+    return preliminaries + _targets_last(cited + crossrefs)
+
+
+def _crossref(entry):
+    return entry["fields"].get("crossref", "").strip().lower()
+
+
+def _targets_last(entries):
+    """
+    Order `entries` so that every entry comes before the entry it crossrefs,
+    keeping the order otherwise.
+    """
+    keys = set(e["key"].lower() for e in entries)
+    referrers = collections.Counter(
+        _crossref(e) for e in entries if _crossref(e) in keys
+    )
+    by_key = {e["key"].lower(): e for e in entries}
+    ready = collections.deque(e for e in entries if not referrers[e["key"].lower()])
+    ordered = []
+    while ready:
+        entry = ready.popleft()
+        ordered.append(entry)
+        parent_key = _crossref(entry)
+        if parent_key in keys:
+            referrers[parent_key] -= 1
+            if not referrers[parent_key]:
+                ready.append(by_key[parent_key])
+    # Crossref cycles can't be ordered, keep them anyway
+    placed = set(id(e) for e in ordered)
+    return ordered + [e for e in entries if id(e) not in placed]
 
 
 def _bibtex(aux_filepath, verbose):
     cwd, aux_filename = os.path.split(aux_filepath)
-    stdout = sys.stdout if verbose else subprocess.PIPE
-    stderr = sys.stderr if verbose else subprocess.PIPE
     try:
         p = subprocess.Popen(
-            ["bibtex", aux_filename], cwd=cwd, stdout=stdout, stderr=stderr
+            ["bibtex", aux_filename],
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            errors="replace",
         )
     except OSError:  # Common for py 2 and 3 and parent of FileNotFoundError
         raise BibtexException("bibtex is not available")
-    p.wait()
+    stdout, stderr = p.communicate()
+    if verbose:
+        # Written rather than passed to bibtex, as they might not be files,
+        # e.g. when served by `bibo serve`
+        sys.stdout.write(stdout)
+        sys.stderr.write(stderr)
     if p.returncode != 0:
         raise BibtexException("bibtex failed", use_verbose=True)
 
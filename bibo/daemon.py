@@ -0,0 +1,288 @@
+"""
+A long-running bibo process that keeps the database in memory and serves
+commands over a Unix socket, and the client that uses it when it is running.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+
+import click
+
+from . import internals
+
+# Commands the daemon can run. Anything else runs in the calling process.
+SERVED_COMMANDS = ["list", "open", "edit"]
+# Commands that might leave the in-memory data different from the file
+_MUTATING_COMMANDS = ["edit"]
+_COMPLETE_VAR = "_BIBO_COMPLETE"
+_COMPLETE_ENV_VARS = [_COMPLETE_VAR, "COMP_WORDS", "COMP_CWORD"]
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+def main():
+    """
+    Entry point for the ``bibo`` command. Run through the daemon if it
+    serves this command, or fall back to running it in this process.
+    """
+    try:
+        response = request(sys.argv[1:])
+    except DaemonUnavailable:
+        from .bibo import cli
+
+        cli()
+    else:
+        sys.stdout.write(response["stdout"])
+        sys.stderr.write(response["stderr"])
+        sys.exit(response["exit_code"])
+
+
+def request(args, environ=None):
+    """
+    Send a command to the daemon serving the database. Raise
+    `DaemonUnavailable` if the command can't be run by a daemon.
+    """
+    if environ is None:
+        environ = os.environ
+    env = {k: environ[k] for k in _COMPLETE_ENV_VARS if k in environ}
+    if _COMPLETE_VAR in env:
+        if "COMP_WORDS" not in env:
+            raise DaemonUnavailable()
+        from click.shell_completion import split_arg_string
+
+        # Tolerates the unclosed quote of a word being completed
+        words = split_arg_string(env["COMP_WORDS"])
+        database, command = _parse_args(words[1:], environ)
+    else:
+        database, command = _parse_args(args, environ)
+        if command not in SERVED_COMMANDS or _needs_terminal(command, args):
+            raise DaemonUnavailable()
+    if not database:
+        raise DaemonUnavailable()
+
+    payload = {
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": env,
+        "color": sys.stdout.isatty(),
+    }
+    try:
+        path = socket_path(os.path.realpath(database))
+        check_private_folder(os.path.dirname(path))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(payload).encode("utf-8"))
+            sock.shutdown(socket.SHUT_WR)
+            return json.loads(_read_all(sock).decode("utf-8"))
+    except (OSError, ValueError):
+        raise DaemonUnavailable()
+
+
+def _parse_args(args, environ):
+    """
+    Return the database and the command name from the command line arguments.
+    The command is `None` for top level options, like ``--help``.
+    """
+    database = environ.get(internals.BIBO_DATABASE_ENV_VAR)
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--database" and i + 1 < len(args):
+            database = args[i + 1]
+            i += 2
+        elif arg.startswith("--database="):
+            database = arg.split("=", 1)[1]
+            i += 1
+        elif arg.startswith("-"):
+            return database, None
+        else:
+            return database, arg
+    return database, None
+
+
+def _needs_terminal(command, args):
+    """
+    Whether the command interacts with the user, e.g. opens an editor.
+    """
+    if command != "edit":
+        return False
+    # Field names without a value are edited in the editor
+    args = iter(args[args.index(command) + 2 :])
+    for arg in args:
+        if arg in ["--file", "--destination"]:
+            next(args, None)
+        elif not arg.startswith("-") and "=" not in arg:
+            return True
+    return False
+
+
+def _read_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def socket_path(database):
+    """
+    Return the path of the Unix socket for serving `database`.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), "bibo-{}".format(os.getuid()))
+    digest = hashlib.sha1(database.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(runtime_dir, "bibo-{}.sock".format(digest))
+
+
+def check_private_folder(folder):
+    """
+    Raise `OSError` unless `folder` is a folder (not a symlink) owned by the
+    current user that no one else can access, as the socket folder can be
+    in the shared temp folder, where anyone could create it first.
+    """
+    st = os.lstat(folder)
+    if (
+        not stat.S_ISDIR(st.st_mode)
+        or st.st_uid != os.getuid()
+        or stat.S_IMODE(st.st_mode) != 0o700
+    ):
+        raise OSError("{} is not a private folder of the current user".format(folder))
+
+
+class Server(socketserver.UnixStreamServer):
+    """
+    Serve bibo commands for a single database, one at a time.
+    """
+
+    def __init__(self, database, data=None):
+        from . import watch
+
+        self.database = database
+        self.path = socket_path(database)
+        folder = os.path.dirname(self.path)
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        try:
+            check_private_folder(folder)
+        except OSError as e:
+            raise click.ClickException("Refusing to serve: {}".format(e))
+        if os.path.exists(self.path):
+            _remove_stale_socket(self.path)
+        super().__init__(self.path, _Handler)
+        os.chmod(self.path, 0o600)
+        self.watcher = watch.Watcher(database, data)
+        self.watcher.start()
+
+    @property
+    def data(self):
+        """
+        The database, updated whenever the file changes.
+        """
+        return self.watcher.refresh()
+
+    def run(self, request):
+        """
+        Run a bibo command, as requested by a client, against the in-memory
+        database, and return its output and exit code.
+        """
+        # The watcher doesn't touch the database while the command runs
+        with self.watcher.lock:
+            return self._run(request)
+
+    def _run(self, request):
+        from .bibo import cli
+
+        # Text streams with a binary buffer, as click writes bytes sometimes
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        stderr = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        cwd = os.getcwd()
+        environ = os.environ.copy()
+        obj = {
+            "database": self.database,
+            "data": self.data,
+            "search_texts": self.watcher.search_texts,
+            "keys": self.watcher.keys,
+        }
+        _, command = _parse_args(request["args"], {})
+        if command in _MUTATING_COMMANDS:
+            # Writes check that the file is still what the data was read from
+            obj["fingerprint"] = self.watcher.fingerprint
+        try:
+            os.chdir(request["cwd"])
+            os.environ.update(request["env"])
+            os.environ[internals.BIBO_DATABASE_ENV_VAR] = self.database
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    cli.main(
+                        request["args"],
+                        prog_name="bibo",
+                        obj=obj,
+                        color=request["color"],
+                    )
+                    exit_code = 0
+                except SystemExit as e:
+                    exit_code = e.code if isinstance(e.code, int) else int(bool(e.code))
+                except Exception as e:
+                    stderr.write("bibo daemon error: {!r}\n".format(e))
+                    exit_code = 1
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+        if command in _MUTATING_COMMANDS:
+            self.watcher.sync(obj["data"])
+        return {
+            "stdout": _getvalue(stdout),
+            "stderr": _getvalue(stderr),
+            "exit_code": exit_code,
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.watcher.close()
+        with contextlib.suppress(OSError):
+            os.remove(self.path)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        payload = self.rfile.read()
+        if not payload:  # A liveness check
+            return
+        request = json.loads(payload.decode("utf-8"))
+        response = self.server.run(request)  # type: ignore
+        self.wfile.write(json.dumps(response).encode("utf-8"))
+
+
+def _getvalue(stream):
+    stream.flush()
+    return stream.buffer.getvalue().decode("utf-8")
+
+
+def _remove_stale_socket(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.remove(path)
+            return
+    raise click.ClickException("bibo is already being served on {}".format(path))
+
+
+def exit_on_sigterm():
+    """
+    Turn SIGTERM into a normal exit, so the socket gets cleaned up.
+    """
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
@@ -0,0 +1,126 @@
+"""
+Find near-duplicate entries.
+
+Entries are reduced to sets of tokens: the words of their normalised title
+and the surnames of their authors.
+Comparing every pair of entries is quadratic, so candidate pairs are found
+with MinHash locality sensitive hashing: each token set gets a signature of
+`NUM_HASHES` minimum hash values, split into bands of `ROWS` values.
+Entries that agree on a whole band share a bucket, and only entries that
+share a bucket are compared.
+Two sets with a Jaccard similarity of s share a bucket with probability
+``1 - (1 - s ** ROWS) ** BANDS``, over 99% for s >= 0.8, and about 6% for s = 0.2.
+"""
+
+import collections
+import hashlib
+import itertools
+import struct
+
+from . import internals
+
+NUM_HASHES = 24
+ROWS = 3
+BANDS = NUM_HASHES // ROWS
+_HASHES = struct.Struct("{}H".format(NUM_HASHES))
+
+
+def tokens(entry):
+    """
+    Return the set of normalised title words and author surnames of `entry`.
+    Author surnames are prefixed with ``author:`` so they are not confused
+    with title words.
+    """
+    fields = entry["fields"]
+    result = set(internals.normalise_text(fields.get("title", "")).split())
+    for last, _ in internals.split_authors(fields.get("author", "")):
+        words = internals.normalise_text(last).split()
+        if words:
+            result.add("author:" + words[-1])
+    return result
+
+
+def similarity(a, b):
+    """
+    Jaccard similarity of two token sets.
+    """
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _token_hashes(token):
+    digest = hashlib.blake2b(token.encode(), digest_size=_HASHES.size).digest()
+    return _HASHES.unpack(digest)
+
+
+def signature(token_set, cache):
+    """
+    MinHash signature of a non-empty `token_set`.
+    The hashes of each token are memoised in `cache`, as most tokens occur
+    in many entries.
+    """
+    hashes = []
+    for token in token_set:
+        h = cache.get(token)
+        if h is None:
+            h = cache[token] = _token_hashes(token)
+        hashes.append(h)
+    return tuple(map(min, zip(*hashes)))
+
+
+def candidate_pairs(signatures):
+    """
+    Yield the (i, j) index pairs, i < j, of signatures that share a band.
+    Each pair is yielded once.
+    """
+    seen = set()
+    for start in range(0, NUM_HASHES, ROWS):
+        buckets = collections.defaultdict(list)
+        for i, band in enumerate([sig[start : start + ROWS] for sig in signatures]):
+            buckets[band].append(i)
+        for bucket in buckets.values():
+            if len(bucket) > 1:
+                for pair in itertools.combinations(bucket, 2):
+                    if pair not in seen:
+                        seen.add(pair)
+                        yield pair
+
+
+def clusters(entries, threshold):
+    """
+    Group `entries` that are at least `threshold` similar, directly or
+    through other entries.
+    Return a list of clusters, each a list of (entry, similarity to the
+    first entry of the cluster) tuples, in database order.
+    """
+    entries = [e for e in entries if e["type"].lower() not in internals.NON_BIB_TYPES]
+    token_sets = [tokens(e) for e in entries]
+    indices = [i for i, t in enumerate(token_sets) if t]
+    cache = {}
+    signatures = [signature(token_sets[i], cache) for i in indices]
+
+    parent = list(range(len(entries)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in candidate_pairs(signatures):
+        i, j = indices[a], indices[b]
+        if similarity(token_sets[i], token_sets[j]) >= threshold:
+            parent[max(find(i), find(j))] = min(find(i), find(j))
+
+    groups = collections.defaultdict(list)
+    for i in indices:
+        groups[find(i)].append(i)
+    result = []
+    for first, members in sorted(groups.items()):
+        if len(members) > 1:
+            first_tokens = token_sets[first]
+            result.append(
+                [(entries[i], similarity(first_tokens, token_sets[i])) for i in members]
+            )
+    return result
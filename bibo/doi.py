@@ -0,0 +1,212 @@
+"""
+Fetch BibTeX entries by DOI.
+"""
+
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import click
+import requests
+import requests.adapters
+import urllib3.util
+
+from . import internals
+
+RESOLVER = "http://dx.doi.org/"
+ACCEPT = "application/x-bibtex"
+# Seconds to wait for connecting and for reading
+TIMEOUT = (5, 30)
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+# Maximum requests per second to a single host
+RATE_LIMIT = 10
+WORKERS = 8
+CACHE_TTL = 30 * 24 * 60 * 60  # Seconds
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+
+class DOIError(click.ClickException):
+    pass
+
+
+def fetch(doi, session=None, cache=None):
+    """
+    Return the raw BibTeX entry for `doi`.
+    A fresh response from the `cache` is used instead of a request.
+    A stale one is used if the request fails.
+    """
+    stale = None
+    if cache is not None:
+        cached = cache.get(doi, ACCEPT)
+        if cached is not None and cached.fresh:
+            return cached.text
+        stale = cached
+    try:
+        text = _get(doi, session)
+    except DOIError:
+        if stale is None:
+            raise
+        return stale.text
+    if cache is not None:
+        cache.put(doi, ACCEPT, text)
+    return text
+
+
+def _get(doi, session=None):
+    http = session or requests
+    url = RESOLVER + doi
+    try:
+        resp = http.get(url, headers={"Accept": ACCEPT}, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        raise DOIError("Failed to fetch {}: {}".format(doi, e))
+    if resp.status_code != 200:
+        raise DOIError("Failed to fetch {}: HTTP {}".format(doi, resp.status_code))
+    return resp.text
+
+
+def fetch_many(dois, workers=WORKERS, cache=None):
+    """
+    Fetch `dois` concurrently, through a pooled session with retries and
+    a per host rate limit, and the optional `cache`.
+    Yield (doi, raw BibTeX entry or `DOIError`) tuples, in order.
+    """
+    rate_limiter = _RateLimiter(RATE_LIMIT)
+
+    def task(doi):
+        if cache is not None:
+            cached = cache.get(doi, ACCEPT)
+            if cached is not None and cached.fresh:
+                return cached.text
+        rate_limiter.wait(urllib.parse.urlsplit(RESOLVER + doi).netloc)
+        try:
+            return fetch(doi, session, cache)
+        except DOIError as e:
+            return e
+
+    with new_session(workers) as session:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from zip(dois, pool.map(task, dois))
+    if cache is not None:
+        cache.evict()
+
+
+def default_cache():
+    return ResponseCache(os.path.join(internals.cache_dir(), "doi"))
+
+
+class CachedResponse:
+    def __init__(self, text, fetched, ttl):
+        self.text = text
+        self.fetched = fetched
+        self.fresh = time.time() - fetched < ttl
+
+
+class ResponseCache:
+    """
+    On-disk cache of resolver responses, keyed by the normalised DOI and the
+    Accept header. Each response is a file. Responses are fresh for `ttl`
+    seconds, and the least recently used are evicted when the cache grows
+    beyond `max_bytes`.
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=None):
+        self.path = path
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def get(self, doi, accept):
+        """
+        Return a `CachedResponse`, or `None` if there is none.
+        """
+        path = self._file_path(doi, accept)
+        try:
+            with open(path) as f:
+                item = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(item["text"], item["fetched"], self.ttl)
+
+    def put(self, doi, accept, text):
+        item = {
+            "doi": internals.normalise_doi(doi),
+            "accept": accept,
+            "fetched": time.time(),
+            "text": text,
+        }
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(item, f)
+            os.replace(tmp_path, self._file_path(doi, accept))
+        except OSError:
+            pass  # Caching is best effort
+
+    def evict(self):
+        """
+        Remove the least recently used responses, until the cache is no
+        larger than `max_bytes`.
+        """
+        items = []
+        with contextlib.suppress(OSError), os.scandir(self.path) as it:
+            for entry in it:
+                with contextlib.suppress(OSError):
+                    stat = entry.stat()
+                    items.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in items)
+        for _, size, path in sorted(items):
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            total -= size
+
+    def _file_path(self, doi, accept):
+        key = "{}\n{}".format(internals.normalise_doi(doi), accept).encode("utf-8")
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest() + ".json")
+
+
+def new_session(pool_size):
+    """
+    Return a `requests.Session` with a connection pool of `pool_size` and
+    retries with exponential backoff.
+    """
+    retry = urllib3.util.Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class _RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = {}
+
+    def wait(self, host):
+        """
+        Block until a request to `host` is allowed.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        time.sleep(slot - now)
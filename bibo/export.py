@@ -0,0 +1,107 @@
+"""
+Export entries as JSON, newline delimited JSON, or CSL-JSON.
+"""
+
+import json
+
+from . import internals
+
+FORMATS = ["json", "ndjson", "csl-json"]
+
+# BibTeX to CSL types (see appendix III of the CSL specification)
+CSL_TYPES = {
+    "article": "article-journal",
+    "book": "book",
+    "booklet": "pamphlet",
+    "inbook": "chapter",
+    "incollection": "chapter",
+    "inproceedings": "paper-conference",
+    "conference": "paper-conference",
+    "manual": "book",
+    "mastersthesis": "thesis",
+    "phdthesis": "thesis",
+    "proceedings": "book",
+    "techreport": "report",
+    "unpublished": "manuscript",
+    "online": "webpage",
+}
+# BibTeX to CSL text variables
+CSL_FIELDS = {
+    "title": "title",
+    "journal": "container-title",
+    "booktitle": "container-title",
+    "volume": "volume",
+    "number": "issue",
+    "edition": "edition",
+    "publisher": "publisher",
+    "address": "publisher-place",
+    "school": "publisher",
+    "institution": "publisher",
+    "abstract": "abstract",
+    "note": "note",
+    "isbn": "ISBN",
+    "issn": "ISSN",
+    "doi": "DOI",
+    "url": "URL",
+}
+CSL_NAMES = ["author", "editor"]
+
+
+def to_csl(entry):
+    """
+    Convert an entry to a CSL-JSON item, with LaTeX converted to text.
+    """
+    fields = entry["fields"]
+    item = {
+        "id": entry["key"],
+        "type": CSL_TYPES.get(entry["type"].lower(), "document"),
+    }
+    for field, value in fields.items():
+        field = field.lower()
+        if field in CSL_FIELDS:
+            item.setdefault(CSL_FIELDS[field], internals.latex_to_text(value))
+        elif field in CSL_NAMES:
+            item[field] = [
+                _csl_name(internals.latex_to_text(last), internals.latex_to_text(first))
+                for last, first in internals.split_authors(value)
+            ]
+        elif field == "pages":
+            item["page"] = "-".join(p.strip() for p in value.split("-") if p.strip())
+    year = fields.get("year", "").strip()
+    if year.isdigit():
+        item["issued"] = {"date-parts": [[int(year)]]}
+    return item
+
+
+def _csl_name(last, first):
+    if not first:
+        return {"literal": last}
+    return {"family": last, "given": first}
+
+
+def to_json(entry):
+    return {"key": entry["key"], "type": entry["type"], "fields": entry["fields"]}
+
+
+def write(entries, f, format_="json"):
+    """
+    Write `entries` to the text file `f` one at a time, so only one entry is
+    encoded in memory at any time.
+    Return the number of written entries.
+    """
+    convert = to_csl if format_ == "csl-json" else to_json
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    count = 0
+    if format_ == "ndjson":
+        for entry in entries:
+            f.write(encode(convert(entry)) + "\n")
+            count += 1
+        return count
+
+    f.write("[")
+    for entry in entries:
+        f.write(",\n" if count else "\n")
+        f.write(encode(convert(entry)))
+        count += 1
+    f.write("\n]\n")
+    return count
@@ -0,0 +1,93 @@
+"""
+Placing attached files: copies, hard links, reflinks, and a content-hash store.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+# Cheapest first. Each strategy falls back to the ones after it.
+LINK_STRATEGIES = ["hard", "reflink", "copy"]
+_FICLONE = 0x40049409  # Linux ioctl, supported by btrfs, XFS, and others
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def place(source, path, link="copy", store=None):
+    """
+    Put `source` at `path`, trying the `link` strategy first and falling
+    back to the more expensive ones when it fails (e.g. hard links across
+    file systems, or reflinks on a file system without copy-on-write).
+    With a `store` folder the file is first added to the store, unless
+    an identical file is already there, and `path` is made from the stored
+    copy.
+    Return the strategy used and whether a stored copy was reused.
+    """
+    reused = False
+    if store:
+        source, reused = store_file(source, store, link)
+    return _link(source, path, link), reused
+
+
+def store_file(source, store, link="copy"):
+    """
+    Add `source` to the `store` folder, named by the SHA-256 of its content.
+    Return the path of the stored file, and whether it was already stored.
+    """
+    digest = file_hash(source)
+    _, extension = os.path.splitext(source)
+    stored = os.path.join(store, digest[:2], digest + extension.lower())
+    if os.path.exists(stored):
+        return stored, True
+    os.makedirs(os.path.dirname(stored), exist_ok=True)
+    # Unique, as the same file may be stored concurrently
+    partial = "{}.{}.part".format(stored, uuid.uuid4().hex)
+    _link(source, partial, link)
+    os.replace(partial, stored)
+    if os.path.exists(partial):  # Hard links to the same file aren't replaced
+        os.remove(partial)
+    return stored, False
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _link(source, path, link):
+    for strategy in LINK_STRATEGIES[LINK_STRATEGIES.index(link) : -1]:
+        try:
+            {"hard": os.link, "reflink": reflink}[strategy](source, path)
+            return strategy
+        except FileExistsError:
+            raise
+        except OSError:
+            pass
+    shutil.copy(source, path)
+    return "copy"
+
+
+def reflink(source, path):
+    """
+    Make `path` a copy-on-write clone of `source`, which shares its data
+    until either is modified.
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported")
+    with open(source, "rb") as src, open(path, "xb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(path)
+            raise
+    shutil.copymode(source, path)
@@ -0,0 +1,193 @@
+"""
+An opt-in full-text index of the files linked to entries.
+
+The index is a SQLite sidecar next to the database. It maps every indexed
+path to the file's stat stamp and SHA-256 hash, and every hash to the text
+of the file, so identical files are extracted and stored once, and
+unchanged files are skipped when the index is updated.
+Searching (``bibo list fulltext:term``) reads the index only.
+
+Text is extracted by the function registered for the file extension under
+the "bibo.extractors" entry point group (e.g. ``pdf=bibo_pdf:extract``),
+which takes a path and returns its text.
+Plain text files are supported out of the box.
+"""
+
+import concurrent.futures
+import functools
+import os
+import sqlite3
+
+import click
+
+from . import files
+from . import internals
+
+EXTRACTORS_GROUP = "bibo.extractors"
+TEXT_EXTENSIONS = ["txt", "text", "md", "markdown", "rst", "tex"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, hash TEXT
+);
+CREATE TABLE IF NOT EXISTS texts (hash TEXT PRIMARY KEY, text TEXT);
+"""
+
+
+def index_path(database):
+    return database + ".fulltext.sqlite"
+
+
+def extract_text(path):
+    """
+    Read a plain text file.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def get_extractor(extension):
+    """
+    Return the text extractor for files with `extension` (without the dot),
+    or None. Plugins take precedence over the built-in extractor.
+    """
+    for entry_point in internals.get_plugins(EXTRACTORS_GROUP):
+        if entry_point.name.lower() == extension:
+            return entry_point.load()
+    if extension in TEXT_EXTENSIONS:
+        return extract_text
+    return None
+
+
+def _extension(path):
+    return os.path.splitext(path)[1][1:].lower()
+
+
+def _extract(path):
+    """
+    Extract the text of `path`, with whitespace collapsed so phrases match
+    across line breaks. Runs in a worker process.
+    """
+    return " ".join(get_extractor(_extension(path))(path).split())
+
+
+class Index:
+    def __init__(self, database):
+        self.connection = sqlite3.connect(index_path(database))
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def text(self, entry):
+        """
+        Return the indexed text of the file of `entry`, or None.
+        """
+        path = entry.get("fields", {}).get("file")
+        if not path:
+            return None
+        row = self.connection.execute(
+            "SELECT text FROM files JOIN texts USING (hash) WHERE path = ?", (path,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def update(self, data, workers=None):
+        """
+        Index the files of the entries in `data` that aren't indexed yet or
+        changed since, and forget files that are no longer linked.
+        Files are hashed and extracted by a pool of `workers` processes
+        (default: the number of CPUs).
+        Return the number of newly indexed files, and a list of errors.
+        """
+        indexed = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.connection.execute(
+                "SELECT path, mtime_ns, size FROM files"
+            )
+        }
+        stored = set(h for h, in self.connection.execute("SELECT hash FROM texts"))
+
+        paths = set()
+        changed = {}  # Path -> (mtime_ns, size)
+        errors = []
+        for entry in internals.bib_entries(data):
+            path = entry["fields"].get("file")
+            if not path or path in paths:
+                continue
+            if get_extractor(_extension(path)) is None:
+                continue
+            paths.add(path)
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                errors.append("Failed to index {}: {}".format(path, e))
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            if indexed.get(path) != stamp:
+                changed[path] = stamp
+
+        new_files = []
+        to_extract = {}  # Hash -> path
+        texts = {}
+        if changed:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                hashes = _map(executor, files.file_hash, list(changed))
+                for path, digest in hashes.items():
+                    if isinstance(digest, Exception):
+                        errors.append("Failed to index {}: {}".format(path, digest))
+                        continue
+                    new_files.append((path,) + changed[path] + (digest,))
+                    if digest not in stored:
+                        to_extract.setdefault(digest, path)
+                texts = _map(executor, _extract, list(to_extract.values()))
+
+        new_texts = []
+        for digest, path in to_extract.items():
+            text = texts[path]
+            if isinstance(text, Exception):
+                errors.append("Failed to extract {}: {!r}".format(path, text))
+                new_files = [f for f in new_files if f[3] != digest]
+            else:
+                new_texts.append((digest, text))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?)", new_texts
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", new_files
+            )
+            self.connection.executemany(
+                "DELETE FROM files WHERE path = ?",
+                [(path,) for path in indexed if path not in paths],
+            )
+            self.connection.execute(
+                "DELETE FROM texts WHERE hash NOT IN (SELECT hash FROM files)"
+            )
+        return len(new_files), errors
+
+
+def _map(executor, function, items):
+    """
+    Return a {item: function(item)} dict, with exceptions as values.
+    """
+    futures = {executor.submit(function, item): item for item in items}
+    results = {}
+    for future in concurrent.futures.as_completed(futures):
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            results[futures[future]] = e
+    return results
+
+
+def open_index(database):
+    """
+    Return the `Index` of `database`, or raise if it wasn't built.
+    """
+    if not os.path.exists(index_path(database)):
+        raise click.ClickException(
+            "No full-text index, run `bibo index` to build it first"
+        )
+    return Index(database)
@@ -1,14 +1,21 @@
 # coding=utf-8
 
+import array
 import collections
 import collections.abc
+import contextlib
+import functools
+import hashlib
 import importlib.metadata
 import itertools
 import os
 import re
 import shutil
 import sys
+import tempfile
+import time
 import typing
+import unicodedata
 
 import click
 
@@ -17,9 +24,41 @@ import pybibs
 from . import models
 from typing import Optional
 
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None  # type: ignore
+
 BIBO_DATABASE_ENV_VAR = "BIBO_DATABASE"
+BIBO_FILE_STORE_ENV_VAR = "BIBO_FILE_STORE"
+# How long to wait for another bibo process to finish writing the database
+LOCK_TIMEOUT_S = 5
 _ANSI_BOLD = "\033[1m"
 _ANSI_UNBOLD = "\033[22m"
+_ENTRY_HEADER = re.compile(
+    r"^[ \t]*@[ \t]*(\w+)[ \t]*[{(][ \t]*([^,\s]+?)[ \t]*,", re.M
+)
+NON_BIB_TYPES = ["string", "comment", "preamble"]
+_LATEX_COMMAND = re.compile(r"\\([a-zA-Z]+|.)")
+_LATEX_LETTERS = {"o": "o", "O": "o", "ss": "ss", "ae": "ae", "AE": "ae", "oe": "oe"}
+_LATEX_LETTERS.update({"OE": "oe", "l": "l", "L": "l", "i": "i", "j": "j"})
+_LATEX_LETTERS.update({"aa": "a", "AA": "a"})
+_NON_ALNUM = re.compile(r"[\W_]+")
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+_UNICODE_LETTERS = str.maketrans({"ø": "o", "æ": "ae", "œ": "oe", "ß": "ss"})
+_UNICODE_LETTERS.update(str.maketrans({"ł": "l", "đ": "d", "ı": "i"}))
+_PLACE_VERBS = {"copy": "Copying", "hard": "Linking", "reflink": "Cloning"}
+_SEARCH_MARKUP = re.compile(
+    r"(?P<open>\{)?\\(?:[\"'`^~=.]\s*|[uvHckrbd](?:\s+|(?=\{)))"
+    r"(?:\{(?P<braced>\\?[a-zA-Z])\}|(?P<bare>\\[ij](?![a-zA-Z])|[a-zA-Z]))(?(open)\})"
+    r"|\\(?P<command>[a-zA-Z]+)\s*"
+    r"|\\(?P<escaped>[^a-zA-Z])"
+    r"|[{}]"
+)
+_AUTHOR_SEPARATOR = re.compile(r"\s+and\s+", re.IGNORECASE)
+_DOI_PREFIX = re.compile(r"^(https?://(dx\.)?doi\.org/|doi:)", re.IGNORECASE)
+# Strings without any of these are left untouched by pylatexenc
+_LATEX_SPECIALS = re.compile(r"[\\{}$~%&]|--|``|''|[!?]`")
 
 
 def header(entry):
@@ -35,22 +74,42 @@ def header(entry):
 
 
 def format_entry(entry, format_pattern):
-    output = []
+    return compile_format(format_pattern)(entry)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_format(format_pattern):
+    """
+    Compile `format_pattern` once into a function that formats an entry.
+    ``$`` followed by letters is replaced with the key, type, or field of
+    that name.
+    """
+    literals = [""]
+    fields = []
     replacement_start_index = -1
     for i, char in enumerate(format_pattern):
         if char == "$":
             replacement_start_index = i + 1
         elif (not char.isalpha()) and (replacement_start_index >= 0):
-            field = format_pattern[replacement_start_index:i]
-            output.append(_lookup(entry, field))
-            output.append(char)
+            fields.append(format_pattern[replacement_start_index:i])
+            literals.append(char)
             replacement_start_index = -1
         elif replacement_start_index == -1:
-            output.append(char)
+            literals[-1] += char
     if replacement_start_index >= 0:
-        field = format_pattern[replacement_start_index:]
-        output.append(_lookup(entry, field))
-    return "".join(output)
+        fields.append(format_pattern[replacement_start_index:])
+        literals.append("")
+
+    # A str.format template with a positional placeholder per field
+    template = "".join(
+        "{}{{}}".format(lit.replace("{", "{{").replace("}", "}}"))
+        for lit in literals[:-1]
+    ) + literals[-1].replace("{", "{{").replace("}", "}}")
+
+    def format_(entry):
+        return template.format(*[_lookup(entry, field) for field in fields])
+
+    return format_
 
 
 def _lookup(entry, field):
@@ -61,6 +120,193 @@ def _lookup(entry, field):
     return "$" + field
 
 
+def latex_to_text(s: str) -> str:
+    """
+    Convert LaTeX to unicode text. Strings without LaTeX are returned as is,
+    and conversions are memoised for the lifetime of the process.
+    """
+    if not _LATEX_SPECIALS.search(s):
+        return s
+    return _cached_latex_to_text(s)
+
+
+@functools.lru_cache(maxsize=2**16)
+def _cached_latex_to_text(s: str) -> str:
+    return _latex_converter().latex_to_text(s)
+
+
+@functools.lru_cache(maxsize=None)
+def _latex_converter():
+    import pylatexenc.latex2text  # type: ignore
+
+    return pylatexenc.latex2text.LatexNodes2Text()
+
+
+def normalise_text(s: str) -> str:
+    """
+    Reduce `s` to lowercase alphanumeric words, for comparing values that
+    differ in case, punctuation, LaTeX markup, or accents.
+    For example, ``Schr{\\"o}dinger`` and ``Schrödinger`` are both
+    ``schrodinger``.
+    """
+    s = _LATEX_COMMAND.sub(lambda m: _LATEX_LETTERS.get(m.group(1), ""), s)
+    s = s.replace("{", "").replace("}", "").lower()
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s).translate(_UNICODE_LETTERS)
+        s = "".join(c for c in s if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", s).strip()
+
+
+def search_text(s: str) -> str:
+    """
+    Return `s` with LaTeX accents, letters, and braces decoded, and accents
+    removed (e.g. ``Schr{\\"o}dinger`` and ``Schrödinger`` are both
+    ``Schrodinger``), for matching search terms.
+    Strings without LaTeX or non-ASCII characters are returned as is.
+    """
+    if is_search_text(s):
+        return s
+    return SearchText(s).text
+
+
+def is_search_text(s: str) -> bool:
+    """
+    Whether `s` is searched as is, without LaTeX or non-ASCII characters.
+    """
+    return s.isascii() and "\\" not in s and "{" not in s
+
+
+class SearchText:
+    """
+    A string folded for searching (see `search_text`), that maps matches
+    back to the original string.
+    """
+
+    __slots__ = ["text", "_source", "_starts", "_ends"]
+
+    def __init__(self, s):
+        self._source = s
+        self.text = "".join(text for text, _, _ in _fold(s))
+        # The offsets of the source of every folded character, built on the
+        # first match, as most values don't match
+        self._starts = None
+        self._ends = None
+
+    def source(self, start, end):
+        """
+        Return the substring of the original string that
+        ``self.text[start:end]`` was made of.
+        """
+        if self._starts is None:
+            self._map()
+        return self._source[self._starts[start] : self._ends[end - 1]]
+
+    def _map(self):
+        starts = array.array("l")
+        ends = array.array("l")
+        for text, start, end in _fold(self._source):
+            if text == self._source[start:end]:  # Unchanged, one to one
+                starts.extend(range(start, end))
+                ends.extend(range(start + 1, end + 1))
+            else:
+                starts.extend([start] * len(text))
+                ends.extend([end] * len(text))
+        self._starts = starts
+        self._ends = ends
+
+
+class SearchTexts(dict):
+    """
+    The `SearchText` of strings, folded the first time they are looked up.
+    Keep one for as long as the data is loaded, so every value is folded
+    once rather than on every search.
+    """
+
+    def __missing__(self, s):
+        folded = self[s] = SearchText(s)
+        return folded
+
+
+def search_values(entry):
+    """
+    Yield the values of `entry` that are folded for searching (see
+    `is_search_text`).
+    """
+    for value in itertools.chain(
+        [entry["key"], entry["type"]], entry["fields"].values()
+    ):
+        if not is_search_text(value):
+            yield value
+
+
+def fold_accents(s: str) -> str:
+    """
+    Remove accents from the non-ASCII characters of `s`, leaving everything
+    else (e.g. regular expressions) as is.
+    """
+    if s.isascii():
+        return s
+    return "".join(text for text, _, _ in _fold_unicode(s, 0))
+
+
+def _fold(s):
+    """
+    Yield (text, start, end) tuples: text that the `s[start:end]` source
+    folds to for searching.
+    """
+    position = 0
+    for match in _SEARCH_MARKUP.finditer(s):
+        yield from _fold_unicode(s[position : match.start()], position)
+        letter = match.group("braced") or match.group("bare")
+        if letter:
+            text = letter[-1]  # Dotless \i is i
+        elif match.group("command"):
+            text = _LATEX_LETTERS.get(match.group("command"), "")
+        else:
+            text = match.group("escaped") or ""
+        yield text, match.start(), match.end()
+        position = match.end()
+    yield from _fold_unicode(s[position:], position)
+
+
+def _fold_unicode(s, offset):
+    position = 0
+    for match in _NON_ASCII.finditer(s):
+        if match.start() > position:
+            yield s[position : match.start()], offset + position, offset + match.start()
+        text = unicodedata.normalize("NFKD", match.group()).translate(_UNICODE_LETTERS)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        yield text, offset + match.start(), offset + match.end()
+        position = match.end()
+    if position < len(s):
+        yield s[position:], offset + position, offset + len(s)
+
+
+def split_authors(s: str) -> typing.List[typing.Tuple[str, str]]:
+    """
+    Split a BibTeX name list into (last name, first names) tuples. Names
+    can be in either ``Last, First`` or ``First Last`` form.
+    """
+    authors = []
+    for author in _AUTHOR_SEPARATOR.split(s.strip()):
+        author = " ".join(author.split())
+        if not author:
+            continue
+        if "," in author:
+            last, first = author.split(",", 1)
+        else:
+            first, _, last = author.rpartition(" ")
+        authors.append((last.strip(), first.strip()))
+    return authors
+
+
+def normalise_doi(doi: str) -> str:
+    """
+    Strip URL or ``doi:`` prefixes and lowercase (DOIs are case insensitive).
+    """
+    return _DOI_PREFIX.sub("", doi.strip()).lower()
+
+
 def destination_heuristic(data):
     """
     A heuristic to get the folder with all other files from bib, using majority
@@ -108,22 +354,44 @@ def string_to_basename(s):
     return re.sub(r"[\s-]+", "-", s)
 
 
-def set_file(data, entry, file_, destination=None, no_copy=False):
+def set_file(
+    data, entry, file_, destination=None, no_copy=False, link="copy", store=None
+):
     if no_copy:
         entry["fields"]["file"] = os.path.abspath(file_)
         return
 
     if not destination:
         destination = destination_heuristic(data)
+    path = file_destination(entry, file_, destination)
+    if os.path.exists(path):
+        raise click.ClickException("{} already exists".format(path))
+    place_file(file_, path, link, store)
+    entry["fields"]["file"] = path
+
+
+def place_file(file_, path, link="copy", store=None):
+    """
+    Put `file_` at `path` with `files.place`, and report how.
+    """
+    from . import files
+
+    strategy, reused = files.place(file_, path, link, store)
+    msg = "{} {} to {}".format(_PLACE_VERBS[strategy], file_, path)
+    if reused:
+        msg += " (already in the store)"
+    click.echo(msg)
+
+
+def file_destination(entry, file_, destination):
+    """
+    Return the path for the copy of `file_` linked to `entry`, in the
+    `destination` folder.
+    """
     destination = os.path.abspath(destination)
     _, file_extension = os.path.splitext(file_)
     basename = string_to_basename(entry["key"])
-    path = os.path.join(destination, basename + file_extension)
-    entry["fields"]["file"] = path
-    if os.path.exists(path):
-        raise click.ClickException("{} already exists".format(path))
-    click.echo("Copying {} to {}".format(file_, path))
-    shutil.copy(file_, path)
+    return os.path.join(destination, basename + file_extension)
 
 
 def editor(*args, **kwargs):
@@ -141,23 +409,219 @@ def complete_key(ctx, param, incomplete):
     """
     Autocompletion for keys.
     """
+    obj = ctx.find_root().obj
     database = ctx.parent.params.get("database")
-    if database:
-        data = load_database(database)
+    if obj and "keys" in obj and obj.get("database") == database:
+        keys = sorted(obj["keys"])
+    elif obj and "data" in obj and obj.get("database") == database:
+        keys = [e["key"] for e in bib_entries(obj["data"])]
+    elif database:
+        keys = load_keys(database)
     else:
-        data = []
-    data = bib_entries(data)
-    return [x["key"] for x in data if x["key"].startswith(incomplete.lower())]
+        keys = []
+    return [k for k in keys if k.startswith(incomplete.lower())]
+
+
+def load_keys(database):
+    """
+    Return the keys of the bibliographic entries in the database, without
+    parsing it. Keys are kept in a cache file, valid as long as the
+    database's modification time and size don't change.
+    """
+    stamp = file_stamp(database)
+    if stamp is None:
+        return []
+    stamp = "{} {}".format(*stamp)
+    cache_path = _keys_cache_path(database)
+    try:
+        with open(cache_path) as f:
+            lines = f.read().split("\n")
+        if lines[0] == stamp:
+            return lines[1:] if lines[1:] != [""] else []
+    except OSError:
+        pass
+
+    with open(database) as f:
+        keys = scan_keys(f.read())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join([stamp] + keys))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Caching is best effort
+    return keys
+
+
+def file_stamp(path):
+    """
+    Return a (modification time, size) tuple that changes whenever the file
+    changes, or `None` if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def scan_keys(string):
+    """
+    Extract the keys of bibliographic entries from the raw .bib content,
+    looking only at the ``@type{key,`` headers.
+    """
+    return [
+        m.group(2)
+        for m in _ENTRY_HEADER.finditer(string)
+        if m.group(1).lower() not in NON_BIB_TYPES
+    ]
+
+
+def _keys_cache_path(database):
+    digest = hashlib.sha1(os.path.abspath(database).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir(), "keys-{}.txt".format(digest))
+
+
+def _lock_path(database):
+    digest = hashlib.sha1(os.path.realpath(database).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir(), "lock-{}".format(digest))
+
+
+def cache_dir():
+    """
+    Return the folder for bibo's cache files (it might not exist yet).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "bibo")
 
 
 def load_database(database):
     """
     Load the database from .bib. Create (in memory) if doesn't exist.
     """
+    return read_database(database)[0]
+
+
+def read_database(database):
+    """
+    Return the entries of the database and its `fingerprint`, which is
+    `None` if the database doesn't exist.
+    """
+    text = _read_text(database)
+    if text is None:
+        return [], None
+    return pybibs.read_string(text), fingerprint(text)
+
+
+def _read_text(path):
     try:
-        return pybibs.read_file(database)
+        with open(path) as f:
+            return f.read()
     except IOError:
-        return []
+        return None
+
+
+def fingerprint(text):
+    """
+    Return a digest of the content of a database, to tell whether it
+    changed since it was read.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def database_lock(database, timeout=None):
+    """
+    Hold an exclusive lock on `database` for reading, changing and writing
+    it, so bibo processes write it one at a time.
+    The lock is an advisory lock on a file in the cache folder, keyed by the
+    real path of the database, as writing replaces the database file (and
+    a file next to it would show up e.g. in version control).
+    Raise if the lock isn't acquired within `timeout` seconds (default:
+    `LOCK_TIMEOUT_S`).
+    """
+    if fcntl is None:
+        yield
+        return
+    if timeout is None:
+        timeout = LOCK_TIMEOUT_S
+    deadline = time.monotonic() + timeout
+    path = _lock_path(database)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    msg = "{} is being written by another process, try again"
+                    raise click.ClickException(msg.format(database))
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_database(obj, merge=None):
+    """
+    Write ``obj["data"]`` to ``obj["database"]``. When ``obj["defer_write"]``
+    is set (e.g. by `bibo shell`) only mark the data as changed, and keep
+    `merge` in ``obj["merges"]``, for the owner of `obj` to write later.
+
+    The database is locked while writing. If it changed since it was read
+    (its fingerprint differs from ``obj["fingerprint"]``), the command's
+    change is applied again to the current database by calling `merge` with
+    its entries, which raises if the change no longer applies. Commands
+    that don't provide `merge` fail instead of overwriting the other change.
+    """
+    if obj.get("defer_write"):
+        obj["changed"] = True
+        obj.setdefault("merges", []).append(merge)
+        return
+    with database_lock(obj["database"]):
+        if "fingerprint" in obj:
+            text = _read_text(obj["database"])
+            current = fingerprint(text) if text is not None else None
+            if current != obj["fingerprint"]:
+                if merge is None:
+                    msg = "{} changed while running the command, nothing was written"
+                    raise click.ClickException(msg.format(obj["database"]))
+                data = pybibs.read_string(text) if text is not None else []
+                merge(data)
+                obj["data"] = data
+        text = write_file_atomically(obj["data"], obj["database"])
+        obj["fingerprint"] = fingerprint(text)
+
+
+def write_file_atomically(data, database):
+    """
+    Write `data` to a temporary file and move it over `database`, so readers
+    never see a partially written database.
+    Return the written text.
+    """
+    text = pybibs.write_string(data)
+    folder = os.path.dirname(os.path.abspath(database))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".bibo-", suffix=".bib")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        if os.path.exists(database):
+            shutil.copymode(database, tmp_path)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, database)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    return text
 
 
 def combine_decorators(decorators):
@@ -176,7 +640,7 @@ def bib_entries(entries):
     Drop @string / @comment / @preamble entries.
     """
     for e in entries:
-        if e["type"].lower() not in ["string", "comment", "preamble"]:
+        if e["type"].lower() not in NON_BIB_TYPES:
             yield e
 
 
@@ -185,6 +649,26 @@ def unique_key_validation(new_key, data):
         raise click.ClickException("Duplicate key, command aborted")
 
 
+def unique_key(key, keys):
+    """
+    Return `key`, or `key` with the first letter suffix (a, b, ..., aa, ...)
+    that is not in `keys`.
+    """
+    candidate = key
+    i = 0
+    while candidate in keys:
+        suffix = ""
+        n = i
+        while True:
+            suffix = chr(ord("a") + n % 26) + suffix
+            n = n // 26 - 1
+            if n < 0:
+                break
+        candidate = key + suffix
+        i += 1
+    return candidate
+
+
 def bold(s: str) -> str:
     """Return `s` wrapped in ANSI bold."""
     return "{}{}{}".format(_ANSI_BOLD, s, _ANSI_UNBOLD)
@@ -248,22 +732,72 @@ def highlight_match(
             )
         else:
             for val in vals:
+                # Matches can be LaTeX, while text is already converted
+                shown = latex_to_text(val)
                 if val.lower() in text.lower():
                     text = highlight_text(text, val)
+                elif shown and shown.lower() in text.lower():
+                    text = highlight_text(text, shown)
                 else:
-                    extra_match_val = extra_match_info.get(key, result.entry[key])
+                    # Keys missing from the entry (e.g. "fulltext") show
+                    # the matches themselves
+                    default = result.entry.get(key, ", ".join(sorted(vals)))
+                    extra_match_val = extra_match_info.get(key, default)
                     extra_match_val = highlight_text(extra_match_val, val)
                     extra_match_info[key] = extra_match_val
     return text, extra_match_info
 
 
-def get_plugins():
+def get_plugins(group="bibo.plugins"):
     """
-    Return a list of EntryPoint objects for group "bibo.plugins".
+    Return a list of EntryPoint objects for `group`, by default the
+    "bibo.plugins" commands.
     """
-    group = "bibo.plugins"
     eps = importlib.metadata.entry_points()
-    if sys.version_info >= (3, 12):
+    if sys.version_info >= (3, 10):
         return eps.select(group=group)
     else:
         return eps.get(group, [])
+
+
+class PluginGroup(click.Group):
+    """
+    A click group with the commands of the "bibo.plugins" entry points.
+    Plugins are only imported when their command is needed.
+    """
+
+    def list_commands(self, ctx):
+        names = set(super().list_commands(ctx))
+        names.update(entry_point.name for entry_point in get_plugins())
+        return sorted(names)
+
+    def get_command(self, ctx, cmd_name):
+        command = super().get_command(ctx, cmd_name)
+        if command is None:
+            for entry_point in get_plugins():
+                if entry_point.name == cmd_name:
+                    command = _load_plugin(entry_point)
+                    self.add_command(command, cmd_name)
+                    break
+        return command
+
+
+def _load_plugin(entry_point):
+    """
+    Load a plugin command. A broken plugin is replaced with a command that
+    reports the error, instead of breaking the entire CLI.
+    """
+    try:
+        return entry_point.load()
+    except Exception as e:
+        msg = "Plugin {} could not be loaded: {!r}".format(entry_point.value, e)
+
+        def broken():
+            raise click.ClickException(msg)
+
+        return click.Command(
+            entry_point.name,
+            callback=broken,
+            short_help="Warning: could not load plugin.",
+            help=msg,
+        )
@@ -0,0 +1,131 @@
+"""
+Merge entries from other .bib files into the database.
+"""
+
+import collections
+
+import click
+
+from . import internals
+
+POLICIES = ["skip", "rename", "overwrite"]
+
+
+def content_hashes(entry):
+    """
+    Return hashable summaries of the work an entry describes: its normalised
+    DOI, and its normalised title with the year.
+    Entries that share any of them are duplicates.
+    """
+    fields = entry["fields"]
+    hashes = []
+    if fields.get("doi"):
+        hashes.append(("doi", internals.normalise_doi(fields["doi"])))
+    title = internals.normalise_text(fields.get("title", ""))
+    if title:
+        hashes.append(("title", title, fields.get("year", "").strip()))
+    return hashes
+
+
+class Merge:
+    """
+    Add entries to `data` one at a time, checking each against an index of
+    keys and an index of content hashes.
+    Conflicts are resolved by `policy`, one of `POLICIES`: skip the incoming
+    entry, rename its key (duplicates are still skipped), or overwrite
+    the existing entry (keeping its key).
+    ``@string`` definitions with a different value than an existing one are
+    conflicts too, that are skipped unless overwritten (as renaming them
+    would change what the entries refer to). ``@preamble`` entries are
+    skipped and reported.
+    """
+
+    def __init__(self, data, policy="skip"):
+        self.data = data
+        self.policy = policy
+        self.counts = collections.Counter()
+        self.by_key = {}
+        self.by_content = {}
+        self.strings = {}
+        for entry in data:
+            type_ = entry["type"].lower()
+            if type_ == "string":
+                self.strings.setdefault(entry["key"].lower(), entry)
+            elif type_ not in internals.NON_BIB_TYPES:
+                self._index(entry)
+
+    def add(self, entry):
+        type_ = entry["type"].lower()
+        if type_ == "string":
+            self._add_string(entry)
+            return
+        if type_ == "preamble":
+            click.echo("@preamble: not imported, skipped")
+            self.counts["skipped"] += 1
+            return
+        if type_ in internals.NON_BIB_TYPES:
+            return
+
+        duplicate = self._find_duplicate(entry)
+        if duplicate is not None:
+            self._conflict(entry, duplicate, "duplicate of")
+            if self.policy == "overwrite":
+                self._overwrite(duplicate, entry)
+            return
+
+        existing = self.by_key.get(entry["key"])
+        if existing is None:
+            self._append(entry)
+        elif self.policy == "rename":
+            key = internals.unique_key(entry["key"], self.by_key)
+            click.echo('"{}": key exists, renamed to "{}"'.format(entry["key"], key))
+            self.counts["renamed"] += 1
+            entry["key"] = key
+            self._append(entry)
+        else:
+            self._conflict(entry, existing, "key exists, different from")
+            if self.policy == "overwrite":
+                self._overwrite(existing, entry)
+
+    def _add_string(self, entry):
+        existing = self.strings.get(entry["key"].lower())
+        if existing is None:
+            self.strings[entry["key"].lower()] = entry
+            self.data.append(entry)
+            self.counts["added"] += 1
+        elif existing["val"] != entry["val"]:
+            self._conflict(entry, existing, "@string with a different value than")
+            if self.policy == "overwrite":
+                existing["val"] = entry["val"]
+
+    def _find_duplicate(self, entry):
+        for h in content_hashes(entry):
+            if h in self.by_content:
+                return self.by_content[h]
+        return None
+
+    def _conflict(self, entry, existing, description):
+        action = "overwritten" if self.policy == "overwrite" else "skipped"
+        msg = '"{}": {} "{}", {}'.format(
+            entry["key"], description, existing["key"], action
+        )
+        click.echo(msg)
+        self.counts[action] += 1
+
+    def _append(self, entry):
+        self.data.append(entry)
+        self._index(entry)
+        self.counts["added"] += 1
+
+    def _overwrite(self, existing, entry):
+        for h in content_hashes(existing):
+            if self.by_content.get(h) is existing:
+                del self.by_content[h]
+        existing["type"] = entry["type"]
+        existing["fields"] = entry["fields"]
+        self._index(existing)
+
+    def _index(self, entry):
+        self.by_key.setdefault(entry["key"], entry)
+        for h in content_hashes(entry):
+            self.by_content.setdefault(h, entry)
@@ -1,5 +1,7 @@
 import collections
 import collections.abc
+import functools
+import heapq
 import itertools
 import re
 import typing
@@ -8,28 +10,49 @@ import click
 
 from . import internals, models
 
+# Matches the text of the file of an entry, see `bibo.fulltext`
+FULLTEXT_FIELD = "fulltext"
+_YEAR = re.compile(r"\d+")
 
-def search(data, search_terms: typing.Iterable[str]):
+
+def search(data, search_terms: typing.Iterable[str], fulltext=None, texts=None):
+    """
+    Yield a `SearchResult` for every entry that matches all `search_terms`.
+    `fulltext` is a function that returns the text of the file of an entry
+    (or None), for matching ``fulltext:`` terms.
+    `texts` is the `internals.SearchTexts` of the loaded data, if it is kept
+    between searches.
+    """
     if isinstance(search_terms, str):
         search_terms = [search_terms]
     search_terms = iter(search_terms)
+    if texts is None:
+        texts = internals.SearchTexts()
     results = (models.SearchResult(e, {}) for e in internals.bib_entries(data))
-    return _recursive_search(results, search_terms)
+    return _recursive_search(results, search_terms, fulltext, texts)
 
 
-def _recursive_search(results, search_terms):
+def _recursive_search(results, search_terms, fulltext=None, texts=None):
     try:
-        search_term = next(search_terms)
+        # Values are searched without accents, see `_match_field`
+        search_term = internals.fold_accents(next(search_terms))
         # Calculate match with search term and update results
-        results = (_update_result(r, _match(r.entry, search_term)) for r in results)
+        results = (
+            _update_result(r, _match(r.entry, search_term, fulltext, texts))
+            for r in results
+        )
         # Drop Nones with empty match
         results = (r for r in results if r)
-        return _recursive_search(results, search_terms)
+        return _recursive_search(results, search_terms, fulltext, texts)
     except StopIteration:
         return results
 
 
-def _match(entry, search_term: str):
+def is_fulltext_term(search_term: str) -> bool:
+    return _parse_search_term(search_term)[0] == FULLTEXT_FIELD
+
+
+def _match(entry, search_term: str, fulltext=None, texts=None):
     """
     Return a similar structure to an entry (nested dict) with matching strings
     as values.
@@ -38,12 +61,17 @@ def _match(entry, search_term: str):
     d: typing.Dict[str, typing.Any] = {}
 
     # For cases where the entire search term is a key (e.g. best:author)
-    _match_field("key", entry["key"], search_term, lambda: d)
+    _match_field("key", entry["key"], search_term, lambda: d, texts)
 
     search_field, search_value = _parse_search_term(search_term)
 
     if search_field in ["key", "type"]:
-        _match_field(search_field, entry[search_field], search_value, lambda: d)
+        _match_field(search_field, entry[search_field], search_value, lambda: d, texts)
+    elif search_field == FULLTEXT_FIELD and fulltext is not None:
+        text = fulltext(entry)
+        if text:
+            # Not kept in `texts`, which is for the values of the entries
+            _match_field(search_field, text, search_value, lambda: d)
     elif search_field in entry["fields"]:
         if search_value:
             _match_field(
@@ -51,15 +79,18 @@ def _match(entry, search_term: str):
                 entry["fields"][search_field],
                 search_value,
                 lambda: d.setdefault("fields", {}),
+                texts,
             )
         # Allow query by field with no value (e.g. bibo list readdate:)
         else:
             d.setdefault("fields", {}).setdefault(search_field, set())
     elif search_field is None:
         for part in ["key", "type"]:
-            _match_field(part, entry[part], search_value, lambda: d)
+            _match_field(part, entry[part], search_value, lambda: d, texts)
         for field, value in entry.get("fields", {}).items():
-            _match_field(field, value, search_value, lambda: d.setdefault("fields", {}))
+            _match_field(
+                field, value, search_value, lambda: d.setdefault("fields", {}), texts
+            )
     return d
 
 
@@ -68,13 +99,25 @@ def _match_field(
     value: str,
     search_value: str,
     get_dict: typing.Callable[[], dict],
+    texts: typing.Optional[typing.Mapping[str, internals.SearchText]] = None,
 ) -> None:
     """
     Try to match a field/value to a search_value. If there are
     matches, `get_dict` is called to get the dictionary to put the results
     in, usually the `match`, or `match["fields"]`.
+    Matching ignores LaTeX markup and accents (see `internals.search_text`),
+    and the matches are the matching parts of the original value.
+    Values are folded once, in `texts`, when given.
     """
-    matches = set(re.findall(search_value, value, re.IGNORECASE))
+    if internals.is_search_text(value):
+        matches = set(re.findall(search_value, value, re.IGNORECASE))
+    else:
+        folded = texts[value] if texts is not None else internals.SearchText(value)
+        matches = set(
+            folded.source(*m.span())
+            for m in re.finditer(search_value, folded.text, re.IGNORECASE)
+            if m.end() > m.start()
+        )
     matches.discard("")
     if matches:
         get_dict().setdefault(field, set()).update(matches)
@@ -107,6 +150,54 @@ def _parse_search_term(search_term: str):
     return "key", search_term.lower()
 
 
+def sort(results, fields, reverse=False, limit=None):
+    """
+    Sort search `results` by `fields`, and return a list of at most `limit`
+    results. Sort keys are computed once per entry (see `sort_key`).
+    With a `limit`, a heap keeps only the top results instead of sorting all
+    of them.
+    """
+    key = functools.partial(_result_sort_key, fields=fields, reverse=reverse)
+    if limit is None:
+        return sorted(results, key=key, reverse=reverse)
+    if reverse:
+        return heapq.nlargest(limit, results, key=key)
+    return heapq.nsmallest(limit, results, key=key)
+
+
+def _result_sort_key(result, fields, reverse):
+    return sort_key(result.entry, fields, reverse)
+
+
+def sort_key(entry, fields, reverse=False):
+    """
+    Return a tuple to sort `entry` by `fields`. Years are compared as
+    numbers, authors and editors by the last name of the first one, and
+    text without case, accents, or LaTeX markup.
+    Entries without a field come after the ones with it, also when sorting
+    in `reverse`.
+    """
+    return tuple(_field_sort_key(entry, field, reverse) for field in fields)
+
+
+def _field_sort_key(entry, field, reverse):
+    if field in ["key", "type"]:
+        return (reverse, 0, entry[field].lower())
+    value = entry["fields"].get(field, "").strip()
+    if field == "year":
+        match = _YEAR.match(value)
+        if match:
+            return (reverse, int(match.group()), "")
+        return (not reverse, 0, "")
+    if field in ["author", "editor"]:
+        authors = internals.split_authors(value)
+        if authors:
+            last, first = authors[0]
+            value = "{} {}".format(last, first)
+    value = internals.normalise_text(value)
+    return (bool(value) == reverse, 0, value)
+
+
 def get(data, search_terms):
     results = list(search(data, search_terms))
 
@@ -122,8 +213,17 @@ def get(data, search_terms):
     return results[0]
 
 
-def get_by_key(data, key):
-    for entry in internals.bib_entries(data):
-        if entry["key"] == key:
+def get_by_key(data, key, keys=None):
+    """
+    Return the first entry with `key`. `keys` is an index of the first
+    entry with every key in `data` (e.g. ``watch.Watcher.keys``), if kept.
+    """
+    if keys is not None:
+        entry = keys.get(key)
+        if entry is not None:
             return entry
+    else:
+        for entry in internals.bib_entries(data):
+            if entry["key"] == key:
+                return entry
     raise click.ClickException('Couldn\'t find"{}"'.format(key))
@@ -0,0 +1,240 @@
+"""
+An interactive shell that runs bibo commands against a database that is
+loaded once, and written back lazily.
+"""
+
+import cmd
+import os
+import shlex
+import threading
+
+import click
+
+from . import internals
+from . import watch
+
+try:
+    import readline
+except ImportError:  # Not available on all platforms
+    readline = None  # type: ignore
+
+# Commands that make no sense inside the shell
+_EXCLUDED_COMMANDS = ["serve", "shell"]
+# Top level options that are available in the shell
+_TOP_LEVEL_OPTIONS = ["--help", "--version"]
+
+
+class Shell(cmd.Cmd):
+    intro = (
+        'Type "help" for the list of commands, "save" to write changes '
+        'to the database, and "exit" to save and quit.'
+    )
+    prompt = "bibo> "
+
+    def __init__(self, cli, database, data, autosave=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cli = cli
+        self.database = database
+        self.obj = {"database": database, "defer_write": True}
+        self.autosave = autosave
+        self.watcher = watch.Watcher(database, data)
+        self.obj["data"] = self.watcher.data
+        self.obj["keys"] = self.watcher.keys
+        self.obj["search_texts"] = self.watcher.search_texts
+        # Held while running a command or saving
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def default(self, line):
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            click.echo("Error: {}".format(e), err=True)
+            return
+        if args[0] in _EXCLUDED_COMMANDS:
+            click.echo('Error: "{}" is not available in the shell'.format(args[0]))
+            return
+        if args[0].startswith("-") and args[0] not in _TOP_LEVEL_OPTIONS:
+            # E.g. --database, which would load another database into the
+            # shell's data
+            msg = 'Error: "{}" is not available in the shell'
+            click.echo(msg.format(args[0].split("=", 1)[0]))
+            return
+        with self._lock:
+            self._reload_if_changed()
+            data = self.obj["data"]
+            changed = self.obj.get("changed")
+            merges = list(self.obj.get("merges", []))
+            try:
+                self.cli.main(
+                    ["--database", self.database] + args,
+                    prog_name="bibo",
+                    obj=self.obj,
+                )
+            except SystemExit:
+                pass
+            if self.obj["database"] != self.database:
+                # The command ran against another database, undo what it
+                # did to the shell's state
+                msg = "Error: the command used another database than {}"
+                click.echo(msg.format(self.database))
+                self.obj["database"] = self.database
+                self.obj["data"] = data
+                self.obj["changed"] = changed
+                self.obj["merges"] = merges
+                self.obj.pop("fingerprint", None)
+            if self.obj.get("changed"):
+                # The watcher's key index is stale until the changes are saved
+                self.obj.pop("keys", None)
+        self._schedule_save()
+
+    def emptyline(self):
+        pass
+
+    def do_help(self, arg):
+        """Show help for bibo commands."""
+        if arg:
+            self.default(arg + " --help")
+        else:
+            self.default("--help")
+            click.echo("\nShell commands:\n  save    Write changes to the database.")
+            click.echo("  reload  Discard unsaved changes and load the database.")
+            click.echo("  exit    Save and quit.")
+
+    def do_save(self, arg):
+        """Write changes to the database."""
+        self.save()
+
+    def do_reload(self, arg):
+        """Discard unsaved changes and load the database."""
+        self.reload()
+
+    def do_exit(self, arg):
+        """Save and quit."""
+        return self.save()
+
+    do_quit = do_exit
+
+    def do_EOF(self, arg):
+        click.echo()
+        self.save()
+        return True  # Nothing more to read
+
+    def completenames(self, text, *ignored):
+        names = super().completenames(text, *ignored)
+        ctx = click.Context(self.cli)
+        names += [
+            c
+            for c in self.cli.list_commands(ctx)
+            if c.startswith(text) and c not in _EXCLUDED_COMMANDS
+        ]
+        return sorted(set(names) - {"EOF"})
+
+    def completedefault(self, text, line, begidx, endidx):
+        if "keys" in self.obj:
+            return sorted(k for k in self.obj["keys"] if k.startswith(text))
+        entries = internals.bib_entries(self.obj["data"])
+        return [e["key"] for e in entries if e["key"].startswith(text)]
+
+    def preloop(self):
+        if readline is not None:
+            try:
+                readline.read_history_file(_history_path())
+            except OSError:
+                pass
+
+    def postloop(self):
+        self.watcher.close()
+        if readline is not None:
+            try:
+                os.makedirs(os.path.dirname(_history_path()), exist_ok=True)
+                readline.write_history_file(_history_path())
+            except OSError:
+                pass
+
+    def save(self):
+        """
+        Write the data to the database, if changed, and return whether it
+        was written.
+
+        If the database was changed outside the shell since it was loaded,
+        the changes of the commands run since are applied again to it, and
+        if they can't be, nothing is written.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.obj.get("changed"):
+                return True
+            obj = {
+                "database": self.database,
+                "data": self.obj["data"],
+                "fingerprint": self.watcher.fingerprint,
+            }
+            try:
+                internals.write_database(obj, self._merge)
+            except click.ClickException as e:
+                e.show()
+                return False
+            self.obj["data"] = obj["data"]
+            self._discard_changes()
+            self.watcher.sync(self.obj["data"])
+            return True
+
+    def reload(self):
+        """
+        Discard the unsaved changes and load the database.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._discard_changes()
+            self.watcher.reload()
+            self._reload_if_changed()
+
+    def _merge(self, data):
+        msg = (
+            "{} was changed outside the shell and the unsaved changes can't be "
+            'applied to it again{}, nothing was written. Use "reload" to '
+            "discard them."
+        )
+        for merge in self.obj.get("merges", []):
+            if merge is None:
+                raise click.ClickException(msg.format(self.database, ""))
+            try:
+                merge(data)
+            except click.ClickException as e:
+                reason = " ({})".format(e.message)
+                raise click.ClickException(msg.format(self.database, reason))
+
+    def _discard_changes(self):
+        self.obj["changed"] = False
+        self.obj.pop("merges", None)
+
+    def _reload_if_changed(self):
+        """
+        Pick up changes made outside the shell, unless there are unsaved
+        changes.
+        """
+        if not self.obj.get("changed"):
+            self.obj["data"] = self.watcher.refresh()
+            self.obj["keys"] = self.watcher.keys
+
+    def _schedule_save(self):
+        """
+        Save after `autosave` seconds without further changes.
+        """
+        if self.autosave is None or not self.obj.get("changed"):
+            return
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.autosave, self.save)
+            self._timer.daemon = True
+            self._timer.start()
+
+
+def _history_path():
+    return os.path.join(internals.cache_dir(), "shell_history")
@@ -0,0 +1,85 @@
+"""
+Summary statistics of entries.
+"""
+
+import collections
+
+from . import internals
+
+HISTOGRAM_WIDTH = 40
+
+
+def columns(entries):
+    """
+    Build a columnar view of `entries`: a list of values per column, in a
+    single pass.
+    Multi-valued columns (``tags`` and ``author``) hold the values of all
+    entries, one after the other.
+    Authors are (grouping key, name) tuples, so the same author is counted
+    once even if written differently (``Tolkien, J.`` / ``J. Tolkien``).
+    """
+    types = []
+    years = []
+    tags = []
+    authors = []
+    for entry in entries:
+        fields = entry["fields"]
+        types.append(entry["type"].lower())
+        year = fields.get("year", "").strip()
+        if year:
+            years.append(year)
+        tags.extend(t.strip() for t in fields.get("tags", "").split(",") if t.strip())
+        for last, first in internals.split_authors(fields.get("author", "")):
+            key = (internals.normalise_text(last), internals.normalise_text(first)[:1])
+            name = "{}, {}".format(last, first) if first else last
+            authors.append((key, name))
+    return {"type": types, "year": years, "tags": tags, "author": authors}
+
+
+def stats(entries, top=10):
+    """
+    Return a dict with the number of entries, counts by type, year and tag,
+    and the `top` authors with their number of entries.
+    """
+    cols = columns(entries)
+    author_counts = collections.Counter(key for key, _ in cols["author"])
+    names = {}
+    for key, name in cols["author"]:
+        if key not in names:
+            names[key] = internals.latex_to_text(name)
+    return {
+        "entries": len(cols["type"]),
+        "types": dict(collections.Counter(cols["type"]).most_common()),
+        "years": dict(sorted(collections.Counter(cols["year"]).items())),
+        "tags": dict(collections.Counter(cols["tags"]).most_common()),
+        "authors": dict(
+            (names[key], count) for key, count in author_counts.most_common(top)
+        ),
+    }
+
+
+def format_text(result):
+    """
+    Format the result of `stats` as text, with a histogram of years.
+    """
+    lines = ["Entries: {}".format(result["entries"])]
+    lines += _section("Types", result["types"])
+    years = result["years"]
+    if years:
+        scale = HISTOGRAM_WIDTH / max(years.values())
+        bars = {y: "#" * max(1, round(c * scale)) for y, c in years.items()}
+        lines += _section(
+            "Years", {y: "{} {}".format(bars[y], c) for y, c in years.items()}
+        )
+    lines += _section("Tags", result["tags"])
+    lines += _section("Authors", result["authors"])
+    return "\n".join(lines)
+
+
+def _section(title, counts):
+    if not counts:
+        return []
+    width = max(len(str(k)) for k in counts)
+    lines = ["", title]
+    lines += ["  {:<{}}  {}".format(k, width, v) for k, v in counts.items()]
+    return lines
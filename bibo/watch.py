@@ -0,0 +1,410 @@
+"""
+Keep a parsed database in sync with the file, for long-running processes
+(`bibo serve`, `bibo shell`, or any program embedding bibo).
+
+Changes are detected with inotify where available, and by polling the
+file's modification time and size otherwise. On a change only the entries
+between the unchanged start and end of the file are parsed again, and the
+key index and the folded search texts are updated for these entries only,
+so the result is the same as loading the whole file, at the cost of the
+edit.
+"""
+
+import bisect
+import collections
+import ctypes
+import os
+import re
+import select
+import struct
+import sys
+import threading
+
+import pybibs
+
+from . import internals
+
+POLL_INTERVAL = 1.0
+
+# Characters that delimit entries, as in `pybibs.read_string`
+_DELIMITERS = re.compile(r"[@{}]")
+# Compare in chunks, as comparing slices is much faster than characters
+_CHUNK = 4096
+
+# From <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_INOTIFY_MASK = (
+    _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+)
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class Watcher:
+    """
+    The entries of `database` (``data``), an index of the first entry
+    with every key (``keys``), and the folded values of the entries for
+    searching (``search_texts``, an `internals.SearchTexts`), kept up to
+    date by `refresh`, or by a background thread after `start`.
+
+    `data` is taken as the parsed content of the file, if given.
+    Hold ``lock`` while using or changing the entries when the background
+    thread runs.
+    """
+
+    def __init__(self, database, data=None):
+        self.database = database
+        self.lock = threading.RLock()
+        self.data = []
+        self.keys = {}
+        self.stamp = None
+        self._text = ""
+        self._starts = []
+        self._ends = []
+        self._counts = collections.Counter()
+        self.search_texts = internals.SearchTexts()
+        # Number of entries with each folded value
+        self._values = collections.Counter()
+        try:
+            self._notifier = _Inotify(database)
+            self.backend = "inotify"
+        except (OSError, AttributeError):  # Not Linux
+            self._notifier = None
+            self.backend = "poll"
+        self._thread = None
+        self._stop = threading.Event()
+        self._load(data)
+
+    @property
+    def fingerprint(self):
+        """
+        The `internals.fingerprint` of the file as last read, or None if it
+        didn't exist.
+        """
+        with self.lock:
+            if self.stamp is None:
+                return None
+            return internals.fingerprint(self._text)
+
+    def changed(self):
+        """
+        Whether the file changed since it was last read.
+        """
+        if self._notifier is not None and self._notifier.read():
+            return True
+        return internals.file_stamp(self.database) != self.stamp
+
+    def refresh(self):
+        """
+        Update the entries if the file changed, and return them.
+        Raise (and keep the previous entries) if the file can't be parsed.
+        """
+        with self.lock:
+            if self.changed():
+                self.update()
+            return self.data
+
+    def update(self):
+        """
+        Read the file and parse the entries that changed.
+        Return the number of parsed entries.
+        """
+        with self.lock:
+            stamp, text = self._read()
+            old = self._text
+            prefix = _common_prefix(old, text)
+            suffix = _common_suffix(old, text, min(len(old), len(text)) - prefix)
+            delta = len(text) - len(old)
+
+            # Entries that end before the first change are the same, and
+            # splitting continues after them as if it had never stopped
+            i = bisect.bisect_right(self._ends, prefix)
+            pos, start = (self._ends[i - 1], self._starts[i - 1]) if i else (0, 0)
+            j = len(self._starts)
+            spans = []
+            for s, e in _split(text, pos, start):
+                if s >= len(text) - suffix:
+                    # From an unchanged entry in the unchanged end onwards,
+                    # entries are the same, only shifted by `delta`
+                    k = bisect.bisect_left(self._starts, s - delta, i)
+                    if k < j and (self._starts[k], self._ends[k]) == (
+                        s - delta,
+                        e - delta,
+                    ):
+                        j = k
+                        break
+                spans.append((s, e))
+            added = [pybibs.read_entry_string(text[s:e]) for s, e in spans]
+            removed = self.data[i:j]
+
+            self.data = self.data[:i] + added + self.data[j:]
+            self._starts = (
+                self._starts[:i]
+                + [s for s, _ in spans]
+                + [s + delta for s in self._starts[j:]]
+            )
+            self._ends = (
+                self._ends[:i]
+                + [e for _, e in spans]
+                + [e + delta for e in self._ends[j:]]
+            )
+            self._text = text
+            self.stamp = stamp
+            self._update_keys(removed, added)
+            self._update_search_texts(removed, added)
+            return len(added)
+
+    def reload(self):
+        """
+        Load the whole file again, e.g. after changing the entries in place
+        without writing them.
+        """
+        with self.lock:
+            if self._notifier is not None:
+                self._notifier.read()
+            self._load()
+            return self.data
+
+    def sync(self, data):
+        """
+        Take `data` as the entries of the file, after writing them to it
+        (e.g. with `internals.write_file_atomically`), or load the file if
+        it was written by someone else since.
+        """
+        with self.lock:
+            if self._notifier is not None:
+                self._notifier.read()
+            stamp, text = self._read()
+            if pybibs.write_string(data) == text:
+                self._adopt(stamp, text, data)
+            else:
+                self._load()
+
+    def start(self, interval=POLL_INTERVAL):
+        """
+        Refresh in a background thread whenever the file changes, checking
+        every `interval` seconds when polling.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._notifier is not None:
+            self._notifier.interrupt()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        if self._notifier is not None:
+            self._notifier.close()
+            self._notifier = None
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            if self._notifier is not None:
+                self._notifier.wait()
+            else:
+                self._stop.wait(interval)
+            if self._stop.is_set():
+                return
+            try:
+                self.refresh()
+            except Exception:
+                pass  # E.g. saved halfway through an edit, try again next time
+
+    def _read(self):
+        stamp = internals.file_stamp(self.database)
+        try:
+            with open(self.database) as f:
+                return stamp, f.read()
+        except IOError:  # Like `internals.load_database`
+            return stamp, ""
+
+    def _load(self, data=None):
+        stamp, text = self._read()
+        spans = list(_split(text))
+        if data is None or len(data) != len(spans):
+            data = [pybibs.read_entry_string(text[s:e]) for s, e in spans]
+        self._adopt(stamp, text, data, spans)
+
+    def _adopt(self, stamp, text, data, spans=None):
+        if spans is None:
+            spans = list(_split(text))
+        self.data = data
+        self._starts = [s for s, _ in spans]
+        self._ends = [e for _, e in spans]
+        self._text = text
+        self.stamp = stamp
+        self._counts = collections.Counter(
+            e["key"] for e in internals.bib_entries(data)
+        )
+        self.keys = {}
+        for entry in internals.bib_entries(data):
+            self.keys.setdefault(entry["key"], entry)
+        self._values = collections.Counter(_search_values(data))
+        # Kept in place, as callers hold on to it. Values that are still
+        # there aren't folded again.
+        for value in list(self.search_texts):
+            if value not in self._values:
+                del self.search_texts[value]
+        for value in self._values:
+            self.search_texts[value]
+
+    def _update_keys(self, removed, added):
+        removed = list(internals.bib_entries(removed))
+        added = list(internals.bib_entries(added))
+        self._counts.subtract(e["key"] for e in removed)
+        self._counts.update(e["key"] for e in added)
+        removed_ids = set(id(e) for e in removed)
+        added_by_key = {}
+        for entry in added:
+            added_by_key.setdefault(entry["key"], entry)
+
+        rescan = set()
+        for key in set(e["key"] for e in removed) | set(added_by_key):
+            current = self.keys.get(key)
+            if self._counts[key] <= 0:
+                del self._counts[key]
+                self.keys.pop(key, None)
+            elif self._counts[key] == 1 and key in added_by_key:
+                self.keys[key] = added_by_key[key]
+            elif (
+                self._counts[key] == 1
+                and current is not None
+                and id(current) not in removed_ids
+            ):
+                pass  # Still the only entry with this key
+            else:
+                rescan.add(key)  # Duplicate keys, find the first one again
+                self.keys.pop(key, None)
+        if rescan:
+            for entry in internals.bib_entries(self.data):
+                if entry["key"] in rescan:
+                    self.keys.setdefault(entry["key"], entry)
+
+    def _update_search_texts(self, removed, added):
+        for value in _search_values(removed):
+            self._values[value] -= 1
+            if self._values[value] <= 0:
+                del self._values[value]
+                self.search_texts.pop(value, None)
+        for value in _search_values(added):
+            self._values[value] += 1
+            self.search_texts[value]  # Folded now rather than when searching
+
+
+def _split(text, pos=0, start=0):
+    """
+    Yield the (start, end) offsets of the entries in `text`, exactly like
+    `pybibs.read_string` splits it, but only looking at delimiters.
+    Splitting can resume at the end of an entry, with its start.
+    """
+    depth = 0
+    for match in _DELIMITERS.finditer(text, pos):
+        char = match.group()
+        if char == "@":
+            if depth == 0:
+                start = match.start()
+        elif char == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                yield start, match.end()
+
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i : i + _CHUNK] == b[i : i + _CHUNK]:
+        i += _CHUNK
+    i = min(i, n)
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _common_suffix(a, b, limit):
+    """
+    Return the length of the common end of `a` and `b`, up to `limit`.
+    """
+    i = 0
+    while (
+        i + _CHUNK <= limit
+        and a[len(a) - i - _CHUNK : len(a) - i] == b[len(b) - i - _CHUNK : len(b) - i]
+    ):
+        i += _CHUNK
+    while i < limit and a[len(a) - i - 1] == b[len(b) - i - 1]:
+        i += 1
+    return i
+
+
+def _search_values(entries):
+    for entry in internals.bib_entries(entries):
+        yield from internals.search_values(entry)
+
+
+class _Inotify:
+    """
+    Events about a file from inotify, watching its folder so that replacing
+    the file (as `internals.write_file_atomically` does) is noticed too.
+    """
+
+    def __init__(self, path):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(None, use_errno=True)
+        folder, name = os.path.split(os.path.abspath(path))
+        self.name = os.fsencode(name)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), _INOTIFY_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+        # Written to by `interrupt` to stop waiting
+        self._interrupt_r, self._interrupt_w = os.pipe()
+
+    def read(self):
+        """
+        Read the pending events, and return whether any is about the file.
+        """
+        changed = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buf):
+                _, mask, _, length = _INOTIFY_EVENT.unpack_from(buf, offset)
+                offset += _INOTIFY_EVENT.size
+                name = buf[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if name == self.name or mask & _IN_Q_OVERFLOW:
+                    changed = True
+
+    def wait(self):
+        """
+        Wait for events, or `interrupt`.
+        """
+        ready, _, _ = select.select([self.fd, self._interrupt_r], [], [])
+        if self._interrupt_r in ready:
+            os.read(self._interrupt_r, 1)
+
+    def interrupt(self):
+        os.write(self._interrupt_w, b"\0")
+
+    def close(self):
+        for fd in [self.fd, self._interrupt_r, self._interrupt_w]:
+            os.close(fd)
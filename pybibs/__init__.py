@@ -1,5 +1,6 @@
 from .pybibs import read_file
 from .pybibs import write_file
 from .pybibs import read_string
+from .pybibs import iter_string
 from .pybibs import read_entry_string
 from .pybibs import write_string
@@ -15,11 +15,12 @@ def write_file(bib, filepath):
 
 
 def read_string(string):
-    bib = []
+    return list(iter_string(string))
+
+
+def iter_string(string):
     for raw_entry in _internals.split_entries(string):
-        entry = read_entry_string(raw_entry)
-        bib.append(entry)
-    return bib
+        yield read_entry_string(raw_entry)
 
 
 def read_entry_string(raw_entry):
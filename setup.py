@@ -70,7 +70,6 @@ setup(
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=[
         "click>=8",
-        "click-plugins",
         "requests",
         "pylatexenc",
         "pyperclip",
@@ -97,7 +96,7 @@ setup(
     # executes the function `main` from this package when invoked:
     entry_points={
         "console_scripts": [
-            "bibo=bibo.bibo:cli",
+            "bibo=bibo.daemon:main",
         ],
     },
 )
@@ -1,4 +1,7 @@
+import http.server
 import shutil
+import threading
+from unittest import mock
 
 import click.testing
 import pytest  # type: ignore
@@ -6,6 +9,16 @@ import pytest  # type: ignore
 import pybibs
 
 
+@pytest.fixture(autouse=True)
+def cache_home(tmpdir, monkeypatch):
+    """
+    Keep cache files of the tests away from the user's cache.
+    """
+    path = tmpdir / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(path))
+    return path
+
+
 @pytest.fixture()
 def database(tmpdir):
     with open("tests/bibo/test.bib") as f:
@@ -27,3 +40,55 @@ def example_pdf(tmpdir):
 @pytest.fixture()
 def runner():
     return click.testing.CliRunner()
+
+
+class _DOIHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve BibTeX for /10.1/<name> DOIs. Names starting with "flaky" fail once
+    before succeeding, and names starting with "missing" are not found.
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:  # type: ignore
+            server.requests.append(self.path)  # type: ignore
+            count = server.requests.count(self.path)  # type: ignore
+        name = self.path.rsplit("/", 1)[-1]
+        if name.startswith("missing"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if name.startswith("flaky") and count == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = "@article{{{}, title={{About {}}}, year={{2020}}}}".format(
+            name.split("-")[0], name
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-bibtex")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def doi_server():
+    """
+    A local stand-in for the DOI resolver, with a list of the request paths.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _DOIHandler)
+    server.lock = threading.Lock()  # type: ignore
+    server.requests = []  # type: ignore
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+    resolver = "http://127.0.0.1:{}/".format(server.server_address[1])
+    with mock.patch("bibo.doi.RESOLVER", resolver), mock.patch(
+        "bibo.doi.BACKOFF_FACTOR", 0
+    ), mock.patch("bibo.doi.RATE_LIMIT", 1000):
+        yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
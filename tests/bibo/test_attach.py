@@ -0,0 +1,85 @@
+import filecmp
+import os
+import shutil
+from unittest import mock
+
+import click
+import pybibs
+import pytest  # type: ignore
+
+from bibo import attach, bibo, internals
+
+
+def _entries(database):
+    return {e["key"]: e for e in internals.bib_entries(pybibs.read_file(database))}
+
+
+@pytest.fixture()
+def pdfs(example_pdf, tmpdir):
+    folder = tmpdir / "new"
+    os.mkdir(str(folder))
+    paths = []
+    for name in ["Asimov1951Foundation.pdf", "gurion2018real.pdf", "unknown.pdf"]:
+        paths.append(str(folder / name))
+        shutil.copy(example_pdf, paths[-1])
+    return paths
+
+
+def test_read_csv():
+    lines = ["key,file", "", "a, a.pdf", "b,b.pdf"]
+    assert attach.read_csv(lines) == [("a", "a.pdf"), ("b", "b.pdf")]
+    with pytest.raises(click.ClickException, match="line 2"):
+        attach.read_csv(["a,a.pdf", "b"])
+
+
+def test_match_files():
+    data = pybibs.read_file("tests/bibo/test.bib")
+    pairs = attach.match_files(data, ["x/Tolkien1937Hobit.pdf", "x/foo.pdf"])
+    assert pairs == [
+        ("tolkien1937hobit", "x/Tolkien1937Hobit.pdf"),
+        (None, "x/foo.pdf"),
+    ]
+
+
+def test_attach_files(runner, database, pdfs, tmpdir):
+    args = ["--database", database, "attach"] + pdfs
+    with mock.patch("bibo.internals.write_database") as write_mock:
+        result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 1
+    assert "Attached 2 files" in result.output
+    assert "No entry matches {}".format(pdfs[2]) in result.output
+    assert write_mock.call_count == 1
+
+    with mock.patch("bibo.internals.write_database"):
+        result = runner.invoke(bibo.cli, args[:-1])
+    assert result.exit_code == 1
+    assert "asimov1951foundation.pdf already exists" in result.output
+
+
+def test_attach_csv(runner, database, pdfs, tmpdir):
+    rows = [
+        "gurion2018real,{}".format(pdfs[1]),
+        "duncan1974signalling,{}".format(pdfs[2]),
+    ]
+    destination = str(tmpdir / "papers")
+    os.mkdir(destination)
+    args = ["--database", database, "attach", "--csv", "-"]
+    args += ["--destination", destination, "--link", "hard"]
+    result = runner.invoke(bibo.cli, args, input="\n".join(rows))
+    assert result.exit_code == 0, result.output
+    assert result.output.endswith("Attached 2 files\n")
+
+    entries = _entries(database)
+    path = os.path.join(destination, "duncan1974signalling.pdf")
+    assert entries["duncan1974signalling"]["fields"]["file"] == path
+    assert os.path.samefile(path, pdfs[2])
+    assert filecmp.cmp(
+        entries["gurion2018real"]["fields"]["file"], pdfs[1], shallow=False
+    )
+
+
+def test_attach_usage(runner, database, pdfs):
+    args = ["--database", database, "attach", "--csv", "-", pdfs[0]]
+    result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 2
+    assert "Specify either FILES or --csv" in result.output
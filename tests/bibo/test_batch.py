@@ -0,0 +1,112 @@
+import json
+import os
+
+import pybibs
+import pytest  # type: ignore
+
+from bibo import batch, bibo, internals
+
+
+def _run(runner, database, lines):
+    args = ["--database", database, "batch"]
+    return runner.invoke(bibo.cli, args, input="\n".join(lines) + "\n")
+
+
+def _entries(database):
+    return {e["key"]: e for e in internals.bib_entries(pybibs.read_file(database))}
+
+
+def test_batch(runner, database):
+    lines = [
+        "# A comment",
+        "add @article{new, title={New}}",
+        "edit new year=2020 'title=A new title'",
+        json.dumps({"op": "edit", "key": "tolkien1937hobit", "fields": {"key": "th"}}),
+        "",
+        "remove asimov1951foundation",
+        "remove tolkien1954lord url",
+    ]
+    result = _run(runner, database, lines)
+    assert result.exit_code == 0, result.output
+    assert "Applied 5 operations" in result.output
+
+    entries = _entries(database)
+    assert entries["new"]["fields"] == {"title": "A new title", "year": "2020"}
+    assert "th" in entries and "tolkien1937hobit" not in entries
+    assert "asimov1951foundation" not in entries
+    assert "url" not in entries["tolkien1954lord"]["fields"]
+
+
+def test_batch_is_all_or_nothing(runner, database):
+    with open(database) as f:
+        before = f.read()
+    lines = [
+        "edit asimov1951foundation year=1952",
+        "edit asimov1951foundation key=tolkien1937hobit",
+    ]
+    result = _run(runner, database, lines)
+    assert result.exit_code == 1
+    assert "line 2: Duplicate key" in result.output
+    with open(database) as f:
+        assert f.read() == before
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        ("rename a b", 'unknown operation "rename"'),
+        ("edit asimov1951foundation year", "expected FIELD=VALUE"),
+        ("edit missing year=1", 'Couldn\'t find "missing"'),
+        ('{"op": "edit"}', "invalid operation"),
+        ("add @article{tolkien1937hobit, title={T}}", "Duplicate key"),
+        ("remove asimov1951foundation isbn", 'has no field "isbn"'),
+        ("set-file asimov1951foundation setup.py --link soft", 'Unknown link "soft"'),
+        ("set-file asimov1951foundation setup.py --link", '"link" must be a string'),
+        ('{"op": "add", "entry": 5}', '"entry" must be a string'),
+        ('{"op": "edit", "key": ["a"], "fields": {}}', '"key" must be a string'),
+        ('{"op": "edit", "key": "a", "fields": ["year"]}', "an object of strings"),
+        ('{"op": "edit", "key": "a", "fields": {"year": 1937}}', "of strings"),
+        ('{"op": "remove", "key": "a", "fields": "year"}', "a list of strings"),
+        ('{"op": "set-file", "key": "a", "file": 1}', '"file" must be a string'),
+    ],
+)
+def test_batch_errors(line, error):
+    data = pybibs.read_file("tests/bibo/test.bib")
+    with pytest.raises(batch.BatchError, match=error):
+        batch.apply(data, batch.parse(["", line]))
+    assert data == pybibs.read_file("tests/bibo/test.bib")
+
+
+def test_batch_set_file(runner, database, example_pdf, tmpdir):
+    destination = tmpdir / "papers"
+    os.mkdir(str(destination))
+    lines = [
+        "set-file asimov1951foundation {} --destination {}".format(
+            example_pdf, destination
+        ),
+        "set-file duncan1974signalling {} --no-copy".format(example_pdf),
+        "set-file tolkien1954lord {} --link hard".format(example_pdf),
+    ]
+    result = _run(runner, database, lines)
+    assert result.exit_code == 0, result.output
+    assert "Linking " in result.output
+
+    entries = _entries(database)
+    path = str(destination / "asimov1951foundation.pdf")
+    assert entries["asimov1951foundation"]["fields"]["file"] == path
+    assert os.path.isfile(path)
+    assert entries["duncan1974signalling"]["fields"]["file"] == example_pdf
+    linked = entries["tolkien1954lord"]["fields"]["file"]
+    assert os.path.samefile(linked, example_pdf)
+
+
+def test_batch_set_file_copies_nothing_on_failure(runner, database, example_pdf):
+    lines = [
+        "set-file asimov1951foundation {}".format(example_pdf),
+        "edit missing year=1",
+    ]
+    result = _run(runner, database, lines)
+    assert result.exit_code == 1
+    assert not os.path.exists(
+        os.path.join(os.path.dirname(database), "asimov1951foundation.pdf")
+    )
@@ -286,6 +286,51 @@ def test_edit_key_duplicate(runner, database):
     assert "duplicate" in result.output.lower()
 
 
+def _edit_concurrently(database, change):
+    """
+    Return an editor mock that lets another process `change` the entries of
+    the database while the editor is open.
+    """
+
+    def edit(*args, **kwargs):
+        data = pybibs.read_file(database)
+        change(data)
+        pybibs.write_file(data, database)
+        return "A note"
+
+    return mock.patch("bibo.internals.editor", side_effect=edit)
+
+
+def test_edit_merges_concurrent_change(runner, database):
+    def change(data):
+        for entry in data:
+            if entry.get("key") == "tolkien1937hobit":
+                entry["fields"]["year"] = "1938"
+
+    args = ["--database", database, "edit", "asimov1951foundation", "note"]
+    with _edit_concurrently(database, change):
+        result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 0, result.output
+
+    entries = {e.get("key"): e for e in pybibs.read_file(database)}
+    assert entries["asimov1951foundation"]["fields"]["note"] == "A note"
+    assert entries["tolkien1937hobit"]["fields"]["year"] == "1938"
+
+
+def test_edit_entry_removed_concurrently(runner, database):
+    def change(data):
+        data[:] = [e for e in data if e.get("key") != "asimov1951foundation"]
+
+    args = ["--database", database, "edit", "asimov1951foundation", "note"]
+    with _edit_concurrently(database, change):
+        result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 1
+    assert "asimov1951foundation" in result.output
+
+    with open(database) as f:
+        assert "asimov1951foundation" not in f.read()
+
+
 def test_edit_file(runner, database, example_pdf, tmpdir):
     args = [
         "--database",
@@ -378,7 +423,8 @@ def test_list_missing_bibtex(popen_mock, runner, database):
 @mock.patch("subprocess.Popen")
 def test_list_failing_bibtex(popen_mock, runner, database):
     p = mock.Mock()
-    p.wait.return_value = 1
+    p.communicate.return_value = ("", "")
+    p.returncode = 1
     popen_mock.return_value = p
     result = runner.invoke(bibo.cli, ["--database", database, "list"])
     assert result.exit_code == 0
@@ -417,3 +463,45 @@ def test_remove_one_entry_at_a_time(runner, database):
         bibo.cli, ["--database", database, "remove", "tolkien1937hobit"]
     )
     assert result.exit_code == 0
+
+
+@mock.patch("bibo.bibo.FIRST_CITATION_BATCH_SIZE", 1)
+@mock.patch("bibo.cite.is_independent", return_value=True)
+@mock.patch("bibo.cite.cite")
+def test_list_citations_in_batches(cite_mock, _, runner, database):
+    cite_mock.side_effect = lambda keys, *args: {k: "cited " + k for k in keys}
+    result = runner.invoke(bibo.cli, ["--database", database, "list"])
+    assert result.exit_code == 0
+    batch_sizes = [len(c.args[0]) for c in cite_mock.call_args_list]
+    assert batch_sizes == [1, 2, 3]
+    keys = [
+        e["key"]
+        for e in pybibs.read_file(database)
+        if e["type"] not in ["string", "comment", "preamble"]
+    ]
+    positions = [result.output.index("cited " + k) for k in keys]
+    assert positions == sorted(positions)
+
+
+def test_list_format_in_batches(runner, database):
+    args = ["--database", database, "list", "--format", "$key"]
+    with mock.patch("bibo.bibo.OUTPUT_BATCH_SIZE", 4), mock.patch(
+        "click.echo", wraps=click.echo
+    ) as echo_mock:
+        result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 6
+    assert echo_mock.call_count == 2
+
+
+def test_list_sort(runner, database):
+    args = ["--database", database, "list", "--format", "$key", "--sort", "year"]
+    result = runner.invoke(bibo.cli, args + ["--reverse", "--limit", "2", "tolkien"])
+    assert result.exit_code == 0, result.output
+    assert result.output == "tolkien1954lord\ntolkien1937hobit\n"
+
+    result = runner.invoke(bibo.cli, args[:-2] + ["--limit", "1"])
+    assert result.output == "tolkien1937hobit\n"
+
+    result = runner.invoke(bibo.cli, args[:-2] + ["--reverse"])
+    assert result.exit_code == 2
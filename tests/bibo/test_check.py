@@ -0,0 +1,82 @@
+import os
+import shutil
+from unittest import mock
+
+import pybibs
+
+from bibo import bibo, check
+
+
+def _entry(key, path):
+    return {"type": "book", "key": key, "fields": {"file": str(path)}}
+
+
+def _problems(data, **kwargs):
+    problems, recorded = check.check(data, **kwargs)
+    found = sorted((p.kind, [e["key"] for e in p.entries]) for p in problems)
+    return found, recorded
+
+
+def test_check(example_pdf, tmpdir):
+    shutil.copy(example_pdf, str(tmpdir / "copy.pdf"))
+    os.link(example_pdf, str(tmpdir / "link.pdf"))
+    (tmpdir / "other.pdf").write("other")
+    (tmpdir / "unreadable.pdf").write("secret")
+    data = [
+        _entry("a", example_pdf),
+        _entry("b", tmpdir / "copy.pdf"),
+        _entry("c", tmpdir / "link.pdf"),
+        _entry("d", tmpdir / "other.pdf"),
+        _entry("e", tmpdir / "missing.pdf"),
+        _entry("f", tmpdir),
+        {"type": "book", "key": "g", "fields": {}},
+        {"type": "comment", "val": "a comment"},
+    ]
+    real_access = os.access
+    with mock.patch(
+        "os.access", lambda p, m: "unreadable" not in p and real_access(p, m)
+    ):
+        data.append(_entry("h", tmpdir / "unreadable.pdf"))
+        problems, recorded = _problems(data)
+    assert problems == [
+        ("duplicate", ["a", "c", "b"]),
+        ("missing", ["e"]),
+        ("missing", ["f"]),
+        ("unreadable", ["h"]),
+    ]
+    assert recorded == 0
+
+
+def test_check_record(example_pdf, tmpdir):
+    (tmpdir / "other.pdf").write("other")
+    data = [_entry("a", example_pdf), _entry("b", tmpdir / "other.pdf")]
+    assert _problems(data, record=True) == ([], 2)
+    assert data[1]["fields"]["filesize"] == "5"
+    assert data[1]["fields"]["filehash"] == check.files.file_hash(
+        str(tmpdir / "other.pdf")
+    )
+
+    # The recorded hash is used, as long as the size is the same
+    with mock.patch("bibo.files.file_hash") as hash_mock:
+        assert _problems(data, record=True) == ([], 0)
+        (tmpdir / "other.pdf").write("changed")
+        assert _problems(data) == ([("changed", ["b"])], 0)
+    assert hash_mock.call_count == 0
+
+
+def test_check_files(runner, database, example_pdf, tmpdir):
+    args = ["--database", database, "check-files"]
+    result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 1
+    path = str(tmpdir / "hobbit.pdf")
+    assert result.output.startswith(
+        'Missing file: "tolkien1937hobit" ({})'.format(path)
+    )
+    assert "1 problems found" in result.output
+
+    shutil.copy(example_pdf, path)
+    result = runner.invoke(bibo.cli, args + ["--record"])
+    assert result.exit_code == 0, result.output
+    assert result.output == "Recorded 1 files\n"
+    data = pybibs.read_file(database)
+    assert data[0]["fields"]["filehash"] == check.files.file_hash(example_pdf)
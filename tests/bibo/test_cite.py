@@ -1,9 +1,22 @@
+import contextlib
+import io
+import os
+import subprocess
 from unittest import mock
 
 import click
 import pytest  # type: ignore
 
 from bibo import cite
+import pybibs
+
+
+@pytest.fixture()
+def workspace(tmpdir):
+    cite.cleanup()
+    with mock.patch("bibo.cite._scratch_root", return_value=str(tmpdir)):
+        yield
+    cite.cleanup()
 
 
 def test_cite_simple(database):
@@ -41,7 +54,140 @@ def test_cite_missing_bibtex(popen_mock, database):
 @mock.patch("subprocess.Popen")
 def test_cite_bibtex_issues(popen_mock, database):
     p = mock.Mock()
-    p.wait.return_value = 1
+    p.communicate.return_value = ("", "")
+    p.returncode = 1
     popen_mock.return_value = p
     with pytest.raises(cite.BibtexException, match="bibtex failed") as e:
         cite.cite(["tolkien1937"], database)
+
+
+@mock.patch("subprocess.Popen")
+def test_cite_verbose_to_any_stream(popen_mock, database):
+    p = mock.Mock()
+    p.communicate.return_value = ("This is BibTeX\n", "Warning\n")
+    p.returncode = 1
+    popen_mock.return_value = p
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    with contextlib.redirect_stdout(stdout):
+        with pytest.raises(cite.BibtexException, match="bibtex failed"):
+            cite.cite(["tolkien1937"], database, verbose=True)
+    assert popen_mock.call_args[1]["stdout"] == subprocess.PIPE
+    stdout.flush()
+    assert stdout.buffer.getvalue() == b"This is BibTeX\n"
+
+
+def test_cite_with_data(database):
+    data = pybibs.read_file(database)
+    results = cite.cite(["tolkien1937hobit"], database, data=data)
+    expected = "John R. R. Tolkien. The Hobbit. 1937."
+    assert results == {"tolkien1937hobit": expected}
+
+
+def test_subset():
+    data = pybibs.read_string(
+        """
+        @string{pub = "Publisher"}
+
+        @comment{Not needed}
+
+        @book{parent,
+            title = {Proceedings},
+        }
+
+        @inproceedings{child,
+            title = {Paper},
+            crossref = {parent},
+        }
+
+        @book{other,
+            title = {Other},
+        }
+        """
+    )
+    subset = cite._subset(["child"], data)
+    assert [e["key"] for e in subset] == ["pub", "child", "parent"]
+
+
+def test_subset_cited_crossref_target():
+    data = pybibs.read_string(
+        """
+        @book{grandparent,
+            title = {Series},
+        }
+
+        @book{parent,
+            title = {Proceedings},
+            crossref = {grandparent},
+        }
+
+        @inproceedings{child,
+            title = {Paper},
+            crossref = {parent},
+        }
+        """
+    )
+    # E.g. sorted by key
+    subset = cite._subset(["grandparent", "parent", "child"], data)
+    assert [e["key"] for e in subset] == ["child", "parent", "grandparent"]
+    subset = cite._subset(["parent", "child"], data)
+    assert [e["key"] for e in subset] == ["child", "parent", "grandparent"]
+
+
+def test_shards():
+    keys = [str(i) for i in range(cite.SHARD_SIZE * 3 + 1)]
+    shards = cite._shards(keys, workers=2)
+    assert len(shards) == 2
+    assert sum(shards, []) == keys
+    assert cite._shards(keys[:10], workers=4) == [keys[:10]]
+
+
+def test_is_shardable():
+    assert cite._is_shardable("plain")
+    assert cite._is_shardable("unsrt")
+    for style in ["alpha", "amsplain", "amsalpha", "IEEEtran", "missing"]:
+        assert not cite._is_shardable(style)
+
+
+@mock.patch("bibo.cite._is_shardable", return_value=True)
+@mock.patch("bibo.cite._cite")
+def test_cite_sharded_merges_in_key_order(cite_mock, _, database):
+    data = pybibs.read_file(database)
+    keys = ["k{}".format(i) for i in range(cite.SHARD_SIZE * 2)]
+    cite_mock.side_effect = lambda shard, *args: {k: k for k in reversed(shard)}
+    with mock.patch("os.cpu_count", return_value=2):
+        results = cite.cite(keys, database, data=data)
+    assert cite_mock.call_count == 2
+    assert list(results) == keys
+
+
+@mock.patch("bibo.cite._is_shardable", return_value=False)
+@mock.patch("bibo.cite._cite")
+def test_cite_not_shardable_runs_once(cite_mock, _, database):
+    data = pybibs.read_file(database)
+    keys = ["k{}".format(i) for i in range(cite.SHARD_SIZE * 2)]
+    cite_mock.return_value = {}
+    with mock.patch("os.cpu_count", return_value=2):
+        cite.cite(keys, database, bibstyle="alpha", data=data)
+    assert cite_mock.call_count == 1
+
+
+def test_cite_leaves_no_files(workspace, database):
+    data = pybibs.read_file(database)
+    cite.cite(["tolkien1937hobit"], database, data=data)
+    assert os.listdir(cite.workspace()) == []
+
+
+@mock.patch("subprocess.Popen")
+def test_cite_leaves_no_files_on_failure(popen_mock, workspace, database):
+    popen_mock.side_effect = OSError()
+    with pytest.raises(cite.BibtexException):
+        cite.cite(["tolkien1937hobit"], database)
+    assert os.listdir(cite.workspace()) == []
+
+
+def test_workspace_is_reused_and_cleaned_up(workspace, tmpdir):
+    path = cite.workspace()
+    assert os.path.dirname(path) == str(tmpdir)
+    assert cite.workspace() == path
+    cite.cleanup()
+    assert not os.path.exists(path)
@@ -0,0 +1,58 @@
+"""
+Stress tests with many bibo processes writing the same database at once.
+"""
+
+import subprocess
+import sys
+
+import pybibs
+
+NUM_ENTRIES = 2000
+NUM_WRITERS = 16
+# The writers wait for each other, which takes a while on a busy machine
+LOCK_TIMEOUT_S = 120
+# Field names are letters only
+FIELDS = ["field" + chr(ord("a") + i) for i in range(NUM_WRITERS)]
+
+
+def _bibo(database, *args):
+    code = (
+        "from bibo import internals; internals.LOCK_TIMEOUT_S = {}; "
+        "from bibo.bibo import cli; cli()"
+    ).format(LOCK_TIMEOUT_S)
+    return subprocess.Popen(
+        [sys.executable, "-c", code, "--database", database] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+
+
+def test_concurrent_edits_are_not_lost(tmpdir):
+    database = str(tmpdir / "stress.bib")
+    data = [
+        {"type": "book", "key": "key{}".format(i), "fields": {"title": str(i)}}
+        for i in range(NUM_ENTRIES)
+    ]
+    pybibs.write_file(data, database)
+
+    # Different entries, and different fields of the same entry
+    writers = [
+        _bibo(database, "edit", "key{}".format(i * 7), "note=writer{}".format(i))
+        for i in range(NUM_WRITERS)
+    ]
+    writers += [
+        _bibo(database, "edit", "key1", "{}=writer{}".format(FIELDS[i], i))
+        for i in range(NUM_WRITERS)
+    ]
+    writers.append(_bibo(database, "remove", "key2", "title"))
+    for writer in writers:
+        output, _ = writer.communicate()
+        assert writer.returncode == 0, output
+
+    entries = {e["key"]: e["fields"] for e in pybibs.read_file(database)}
+    assert len(entries) == NUM_ENTRIES
+    for i in range(NUM_WRITERS):
+        assert entries["key{}".format(i * 7)]["note"] == "writer{}".format(i)
+        assert entries["key1"][FIELDS[i]] == "writer{}".format(i)
+    assert "title" not in entries["key2"]
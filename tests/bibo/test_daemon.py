@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+import click
+import pytest  # type: ignore
+
+from bibo import daemon, internals, query
+
+
+@pytest.fixture()
+def runtime_dir(monkeypatch):
+    # Short path, as Unix socket paths are limited in length
+    path = tempfile.mkdtemp()
+    monkeypatch.setenv("XDG_RUNTIME_DIR", path)
+    yield path
+    shutil.rmtree(path)
+
+
+@pytest.fixture()
+def server(runtime_dir, database):
+    server = daemon.Server(database, internals.load_database(database))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def _list(database, *search_terms):
+    args = ["--database", database, "list", "--format", "$key"]
+    return daemon.request(args + list(search_terms), environ={})
+
+
+def test_list(server, database):
+    with mock.patch("bibo.internals.read_database") as read_database_mock:
+        response = _list(database, "tolkien")
+    read_database_mock.assert_not_called()
+    assert response == {
+        "stdout": "tolkien1937hobit\ntolkien1954lord\n",
+        "stderr": "",
+        "exit_code": 0,
+    }
+
+
+def test_list_uses_folded_values_of_the_server(server, database):
+    with mock.patch("bibo.internals.SearchTexts") as search_texts_mock:
+        assert _list(database, "tolkien")["exit_code"] == 0
+    search_texts_mock.assert_not_called()
+
+
+def test_error(server, database):
+    args = ["--database", database, "open", "agnon"]
+    response = daemon.request(args, environ={})
+    assert response["exit_code"] == 1
+    assert "No entries found" in response["stderr"]
+
+
+def test_reload_on_change(server, database):
+    with open(database, "a") as f:
+        f.write("\n\n@book{new,\n  title = {New},\n}")
+    assert _list(database, "new")["stdout"] == "new\n"
+
+
+def test_edit(server, database):
+    args = ["--database", database, "edit", "asimov1951foundation", "year=1952"]
+    assert daemon.request(args, environ={})["exit_code"] == 0
+    with open(database) as f:
+        assert "year = {1952}" in f.read()
+    assert _list(database, "year:1952")["stdout"] == "asimov1951foundation\n"
+
+
+def test_complete(server, database):
+    environ = {
+        "_BIBO_COMPLETE": "bash_complete",
+        "COMP_WORDS": "bibo --database {} edit tol".format(database),
+        "COMP_CWORD": "4",
+    }
+    response = daemon.request([], environ=environ)
+    assert response["stdout"].split() == [
+        "plain,tolkien1937hobit",
+        "plain,tolkien1954lord",
+    ]
+
+
+@pytest.mark.parametrize("running", [True, False])
+def test_complete_unclosed_quote(runtime_dir, database, running, request):
+    if running:
+        request.getfixturevalue("server")
+    environ = {
+        "_BIBO_COMPLETE": "bash_complete",
+        "COMP_WORDS": 'bibo --database {} edit "tol'.format(database),
+        "COMP_CWORD": "4",
+    }
+    if running:
+        response = daemon.request([], environ=environ)
+        assert response["exit_code"] == 0
+    else:
+        with pytest.raises(daemon.DaemonUnavailable):
+            daemon.request([], environ=environ)
+
+
+def test_key_lookups_use_the_index_of_the_server(server, database):
+    environ = {
+        "_BIBO_COMPLETE": "bash_complete",
+        "COMP_WORDS": "bibo --database {} edit tol".format(database),
+        "COMP_CWORD": "4",
+    }
+    with mock.patch("bibo.internals.bib_entries", side_effect=AssertionError):
+        response = daemon.request([], environ=environ)
+    assert len(response["stdout"].split()) == 2
+
+    keys = server.watcher.keys
+    args = ["--database", database, "edit", "asimov1951foundation", "year=1952"]
+    with mock.patch("bibo.query.get_by_key", wraps=query.get_by_key) as m:
+        assert daemon.request(args, environ={})["exit_code"] == 0
+    assert m.call_args_list[0][0][2] is keys
+
+
+def test_not_running(runtime_dir, database):
+    with pytest.raises(daemon.DaemonUnavailable):
+        _list(database)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["add"],
+        ["--help"],
+        ["edit", "asimov1951foundation", "title"],
+    ],
+)
+def test_not_served(server, database, args):
+    with pytest.raises(daemon.DaemonUnavailable):
+        daemon.request(["--database", database] + args, environ={})
+
+
+@pytest.mark.parametrize("unsafe", ["shared", "symlink"])
+def test_socket_folder_must_be_private(monkeypatch, database, tmpdir, unsafe):
+    folder = str(tmpdir / "runtime")
+    if unsafe == "shared":
+        os.mkdir(folder, 0o700)
+        os.chmod(folder, 0o777)
+    else:
+        os.mkdir(str(tmpdir / "elsewhere"), 0o700)
+        os.symlink(str(tmpdir / "elsewhere"), folder)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", folder)
+    with pytest.raises(click.ClickException, match="Refusing to serve"):
+        daemon.Server(database)
+    with pytest.raises(daemon.DaemonUnavailable):
+        _list(database)
+
+
+def test_already_serving(server, database):
+    with pytest.raises(Exception, match="already being served"):
+        daemon.Server(database)
@@ -0,0 +1,83 @@
+import random
+import time
+
+import pytest  # type: ignore
+
+from bibo import bibo, dedupe
+
+# Generous, to catch regressions rather than measure exact timing
+BENCHMARK_SIZE = 100_000
+BENCHMARK_THRESHOLD_S = 60
+
+
+def _entry(key, title, author=""):
+    return {"type": "article", "key": key, "fields": {"title": title, "author": author}}
+
+
+def test_tokens():
+    entry = _entry(
+        "a", "{T}he H{\\'o}bbit", "Tolkien, J. R. R. and Christopher Tolkien"
+    )
+    assert dedupe.tokens(entry) == {"the", "hobbit", "author:tolkien"}
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [({"a", "b"}, {"a", "b"}, 1), ({"a", "b"}, {"b", "c"}, 1 / 3), (set(), set(), 0)],
+)
+def test_similarity(a, b, expected):
+    assert dedupe.similarity(a, b) == expected
+
+
+def test_clusters():
+    entries = [
+        _entry("a", "The Hobbit, or There and Back Again", "Tolkien, John R. R."),
+        _entry("b", "Foundation", "Asimov, Isaac"),
+        _entry("c", "The {H}obbit: or there and back again", "J. Tolkien"),
+        _entry("d", "The Hobbit or there and back", "Tolkien, J."),
+        _entry("e", "Foundation and Empire", "Asimov, Isaac"),
+        {"type": "string", "key": "s", "val": "The Hobbit"},
+        _entry("f", ""),
+    ]
+    clusters = dedupe.clusters(entries, 0.8)
+    assert [[(e["key"], round(s, 2)) for e, s in c] for c in clusters] == [
+        [("a", 1), ("c", 1), ("d", 0.88)]
+    ]
+
+
+def test_dedupe(runner, database):
+    with open(database, "a") as f:
+        f.write("@book{hobbit, title={The {H}obbit}, author={J. R. R. Tolkien}}\n")
+    args = ["--database", database, "dedupe"]
+    result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 0, result.output
+    assert result.output == "tolkien1937hobit\n  1.00 hobbit\n"
+    result = runner.invoke(bibo.cli, args + ["--threshold", "1.1"])
+    assert result.exit_code == 2
+
+
+@pytest.mark.benchmark
+def test_clusters_benchmark():
+    """
+    Find duplicates planted in a large database of random entries.
+    """
+    rng = random.Random(0)
+    words = ["word{}".format(i) for i in range(20_000)]
+    names = ["Name{}".format(i) for i in range(5_000)]
+    entries = []
+    for i in range(BENCHMARK_SIZE):
+        title = " ".join(rng.choices(words, k=rng.randint(5, 12)))
+        authors = rng.choices(names, k=rng.randint(1, 3))
+        entries.append(_entry(str(i), title, " and ".join(authors)))
+    for entry in entries[::1000]:
+        fields = entry["fields"]
+        title = "{" + fields["title"].upper() + "}"
+        entries.append(_entry(entry["key"] + "-copy", title, fields["author"]))
+
+    start = time.perf_counter()
+    clusters = dedupe.clusters(entries, 0.8)
+    assert time.perf_counter() - start < BENCHMARK_THRESHOLD_S
+    keys = [[e["key"] for e, _ in cluster] for cluster in clusters]
+    assert keys == [
+        [str(i), "{}-copy".format(i)] for i in range(0, BENCHMARK_SIZE, 1000)
+    ]
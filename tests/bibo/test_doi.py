@@ -0,0 +1,92 @@
+import time
+from unittest import mock
+
+import pybibs
+
+from bibo import bibo, doi, internals
+
+
+def test_rate_limiter():
+    rate_limiter = doi._RateLimiter(20)
+    start = time.monotonic()
+    for _ in range(3):
+        rate_limiter.wait("example.com")
+    rate_limiter.wait("other.com")
+    assert 0.1 <= time.monotonic() - start < 0.5
+
+
+def test_fetch_many(doi_server):
+    dois = ["10.1/a", "10.1/flaky", "10.1/missing", "10.1/b"]
+    results = list(doi.fetch_many(dois, workers=2))
+    assert [d for d, _ in results] == dois
+    assert "About a" in results[0][1]
+    assert "About flaky" in results[1][1]  # Retried
+    assert isinstance(results[2][1], doi.DOIError)
+    assert doi_server.requests.count("/10.1/flaky") == 2
+
+
+def test_add_doi_file(runner, database, doi_server):
+    dois = [
+        "10.1/a",
+        "https://doi.org/10.1/A",  # Duplicate
+        "",
+        "10.1/tolkien1937hobit-x",  # Key taken
+        "10.1016/0022-1031(74)90070-5",  # Already in the database
+        "10.1/missing",
+        "10.1/flaky",
+    ]
+    args = ["--database", database, "add", "--doi-file", "-"]
+    result = runner.invoke(bibo.cli, args, input="\n".join(dois))
+    assert result.exit_code == 1
+    assert "Added 3 entries" in result.output
+    assert "1 DOIs couldn't be added" in result.output
+    assert "/10.1016/0022-1031(74)90070-5" not in doi_server.requests
+
+    entries = {e["key"]: e for e in internals.bib_entries(pybibs.read_file(database))}
+    assert entries["a"]["fields"]["doi"] == "10.1/a"
+    assert entries["tolkien1937hobita"]["fields"]["title"] == (
+        "About tolkien1937hobit-x"
+    )
+    assert "flaky" in entries
+
+
+def test_fetch_cached(doi_server, tmpdir):
+    cache = doi.ResponseCache(str(tmpdir / "doi"))
+    assert "About a" in doi.fetch("10.1/a", cache=cache)
+    assert "About a" in doi.fetch("https://doi.org/10.1/A", cache=cache)
+    assert doi_server.requests == ["/10.1/a"]
+
+
+def test_fetch_cached_expired(doi_server, tmpdir):
+    cache = doi.ResponseCache(str(tmpdir / "doi"), ttl=0)
+    doi.fetch("10.1/a", cache=cache)
+    doi.fetch("10.1/a", cache=cache)
+    assert doi_server.requests == ["/10.1/a", "/10.1/a"]
+
+
+def test_fetch_cached_offline(doi_server, tmpdir):
+    cache = doi.ResponseCache(str(tmpdir / "doi"), ttl=0)
+    doi.fetch("10.1/a", cache=cache)
+    with mock.patch("bibo.doi.RESOLVER", "http://127.0.0.1:1/"):
+        assert "About a" in doi.fetch("10.1/a", cache=cache)
+
+
+def test_cache_eviction(tmpdir):
+    cache = doi.ResponseCache(str(tmpdir / "doi"), max_bytes=450)
+    for i in range(4):
+        cache.put("10.1/{}".format(i), doi.ACCEPT, "x" * 100)
+        time.sleep(0.01)
+    cache.get("10.1/0", doi.ACCEPT)  # Recently used
+    cache.evict()
+    kept = [i for i in range(4) if cache.get("10.1/{}".format(i), doi.ACCEPT)]
+    assert kept == [0, 3]
+
+
+def test_add_doi_file_twice(runner, database, doi_server):
+    args = ["--database", database, "add", "--doi-file", "-"]
+    runner.invoke(bibo.cli, args, input="10.1/a\n10.1/b\n")
+    runner.invoke(bibo.cli, ["--database", database, "remove", "a"])
+    result = runner.invoke(bibo.cli, args, input="10.1/a\n")
+    assert result.exit_code == 0
+    assert "Added 1 entries" in result.output
+    assert sorted(doi_server.requests) == ["/10.1/a", "/10.1/b"]
@@ -0,0 +1,116 @@
+import io
+import json
+import time
+import tracemalloc
+
+import pytest  # type: ignore
+
+from bibo import bibo, export
+
+# Generous, to catch regressions rather than measure exact timing
+BENCHMARK_SIZE = 100_000
+BENCHMARK_THRESHOLD_S = 30
+MEMORY_THRESHOLD_BYTES = 1 << 20
+
+
+def _entries(n):
+    for i in range(n):
+        fields = {
+            "title": "Title number {}".format(i),
+            "author": "Doe, Jane and Richard Roe",
+            "year": "2001",
+            "journal": "Journal",
+            "pages": "1--10",
+        }
+        yield {"type": "article", "key": "key{}".format(i), "fields": fields}
+
+
+class _Sink:
+    """
+    A text file that only counts what is written to it.
+    """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, s):
+        self.size += len(s)
+
+
+def test_to_csl():
+    entry = {
+        "type": "InProceedings",
+        "key": "key",
+        "fields": {
+            "title": "{\\'E}t{\\'e}",
+            "author": "Doe, Jane and Plato",
+            "booktitle": "Proceedings",
+            "year": "2001",
+            "pages": "1 -- 10",
+            "doi": "10.1/x",
+            "tags": "ignored",
+        },
+    }
+    assert export.to_csl(entry) == {
+        "id": "key",
+        "type": "paper-conference",
+        "title": "Été",
+        "author": [{"family": "Doe", "given": "Jane"}, {"literal": "Plato"}],
+        "container-title": "Proceedings",
+        "issued": {"date-parts": [[2001]]},
+        "page": "1-10",
+        "DOI": "10.1/x",
+    }
+
+
+@pytest.mark.parametrize("format_", export.FORMATS)
+def test_write(format_):
+    f = io.StringIO()
+    assert export.write(_entries(3), f, format_) == 3
+    if format_ == "ndjson":
+        items = [json.loads(line) for line in f.getvalue().splitlines()]
+    else:
+        items = json.loads(f.getvalue())
+    assert len(items) == 3
+    if format_ == "csl-json":
+        assert items[2]["id"] == "key2"
+    else:
+        assert items == list(_entries(3))
+
+
+@pytest.mark.parametrize("format_", export.FORMATS)
+def test_write_empty(format_):
+    f = io.StringIO()
+    export.write([], f, format_)
+    assert f.getvalue() == ("" if format_ == "ndjson" else "[\n]\n")
+
+
+def test_export(runner, database, tmpdir):
+    output = str(tmpdir / "out.json")
+    args = ["--database", database, "export", "--to", "ndjson", "tolkien"]
+    result = runner.invoke(bibo.cli, args + ["--output", output])
+    assert result.exit_code == 0, result.output
+    with open(output) as f:
+        keys = [json.loads(line)["key"] for line in f]
+    assert keys == ["tolkien1937hobit", "tolkien1954lord"]
+
+    result = runner.invoke(bibo.cli, ["--database", database, "export"])
+    assert len(json.loads(result.output)) == 6
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("format_", export.FORMATS)
+def test_write_benchmark(format_):
+    start = time.perf_counter()
+    sink = _Sink()
+    assert export.write(_entries(BENCHMARK_SIZE), sink, format_) == BENCHMARK_SIZE
+    assert time.perf_counter() - start < BENCHMARK_THRESHOLD_S
+
+    # Memory use doesn't grow with the number of entries
+    tracemalloc.start()
+    try:
+        export.write(_entries(BENCHMARK_SIZE // 10), _Sink(), format_)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < MEMORY_THRESHOLD_BYTES
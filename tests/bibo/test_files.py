@@ -0,0 +1,69 @@
+import filecmp
+import os
+from unittest import mock
+
+import pytest  # type: ignore
+
+from bibo import bibo, files
+
+
+def _fake_clone(dst_fd, request, src_fd):
+    os.write(dst_fd, os.pread(src_fd, 1 << 20, 0))
+
+
+@pytest.mark.parametrize("link", files.LINK_STRATEGIES)
+def test_place(example_pdf, tmpdir, link):
+    path = str(tmpdir / "placed.pdf")
+    # Pretend the file system supports reflinks
+    with mock.patch("fcntl.ioctl", side_effect=_fake_clone):
+        strategy, reused = files.place(example_pdf, path, link)
+    assert (strategy, reused) == (link, False)
+    assert filecmp.cmp(example_pdf, path, shallow=False)
+    assert os.path.samefile(example_pdf, path) == (link == "hard")
+
+
+def test_place_falls_back(example_pdf, tmpdir):
+    path = str(tmpdir / "placed.pdf")
+    with mock.patch("os.link", side_effect=OSError), mock.patch(
+        "fcntl.ioctl", side_effect=OSError
+    ):
+        assert files.place(example_pdf, path, "hard") == ("copy", False)
+    assert filecmp.cmp(example_pdf, path, shallow=False)
+
+
+def test_place_does_not_overwrite(example_pdf, tmpdir):
+    path = tmpdir / "placed.pdf"
+    path.write("")
+    with pytest.raises(FileExistsError):
+        files.place(example_pdf, str(path), "hard")
+    assert path.read() == ""
+
+
+def test_store(example_pdf, tmpdir):
+    store = str(tmpdir / "store")
+    copy = str(tmpdir / "copy.PDF")
+    files.place(example_pdf, copy)
+
+    assert files.place(example_pdf, str(tmpdir / "a.pdf"), "hard", store) == (
+        "hard",
+        False,
+    )
+    assert files.place(copy, str(tmpdir / "b.pdf"), "hard", store) == ("hard", True)
+    digest = files.file_hash(example_pdf)
+    stored = os.path.join(store, digest[:2], digest + ".pdf")
+    assert os.listdir(os.path.dirname(stored)) == [os.path.basename(stored)]
+    assert os.path.samefile(stored, str(tmpdir / "b.pdf"))
+
+
+def test_add_with_store(runner, database, example_pdf, tmpdir):
+    store = str(tmpdir / "store")
+    for key in ["tolkien1954lord", "asimov1951foundation"]:
+        args = ["--database", database, "edit", key, "--file", example_pdf]
+        args += ["--link", "hard"]
+        result = runner.invoke(bibo.cli, args, env={"BIBO_FILE_STORE": store})
+        assert result.exit_code == 0, result.output
+    assert result.output.startswith("Linking ")
+    assert result.output.strip().endswith("(already in the store)")
+    assert os.path.samefile(
+        str(tmpdir / "tolkien1954lord.pdf"), str(tmpdir / "asimov1951foundation.pdf")
+    )
@@ -0,0 +1,96 @@
+import os
+from unittest import mock
+
+import pybibs
+import pytest  # type: ignore
+
+from bibo import bibo, fulltext, query
+
+
+def _entry(key, path):
+    return {"type": "misc", "key": key, "fields": {"file": str(path)}}
+
+
+@pytest.fixture()
+def notes(tmpdir):
+    paths = {}
+    for name, text in [
+        ("a.txt", "Hobbits\nlive in   holes."),
+        ("b.md", "# Foundation\n\nPsychohistory predicts the future."),
+        ("c.txt", "Hobbits\nlive in   holes."),
+        ("d.pdf", "%PDF"),
+    ]:
+        paths[name] = tmpdir / name
+        paths[name].write(text)
+    return paths
+
+
+def test_get_extractor():
+    assert fulltext.get_extractor("md") is fulltext.extract_text
+    assert fulltext.get_extractor("pdf") is None
+
+    plugin = mock.Mock()
+    plugin.name = "pdf"
+    with mock.patch("bibo.internals.get_plugins", return_value=[plugin]):
+        fulltext.get_extractor.cache_clear()
+        assert fulltext.get_extractor("pdf") is plugin.load.return_value
+    fulltext.get_extractor.cache_clear()
+
+
+def test_index(tmpdir, notes):
+    database = str(tmpdir / "test.bib")
+    data = [_entry(k, notes[n]) for k, n in [("a", "a.txt"), ("b", "b.md")]]
+    data += [_entry("c", notes["c.txt"]), _entry("d", notes["d.pdf"])]
+    data.append(_entry("e", tmpdir / "missing.txt"))
+
+    index = fulltext.Index(database)
+    count, errors = index.update(data, workers=2)
+    assert count == 3
+    assert len(errors) == 1 and "missing.txt" in errors[0]
+    assert index.text(data[0]) == "Hobbits live in holes."
+    assert index.text(data[2]) == index.text(data[0])
+    assert index.text(data[3]) is None
+    rows = index.connection.execute("SELECT COUNT(*) FROM texts").fetchone()
+    assert rows == (1 + 1,)  # Identical files are stored once
+
+    # Only changed files are read again
+    notes["b.md"].write("Changed")
+    with mock.patch("bibo.fulltext._extract", side_effect=AssertionError):
+        assert index.update(data[:1], workers=1) == (0, [])
+    assert index.update(data[:2], workers=1)[0] == 1
+    assert index.text(data[1]) == "Changed"
+    assert index.text(data[2]) is None  # Not linked anymore
+    index.close()
+
+
+def test_search_fulltext(tmpdir, notes):
+    database = str(tmpdir / "test.bib")
+    data = [_entry("a", notes["a.txt"]), _entry("b", notes["b.md"])]
+    index = fulltext.Index(database)
+    index.update(data, workers=1)
+    results = list(query.search(data, ["fulltext:in holes"], index.text))
+    assert [r.entry["key"] for r in results] == ["a"]
+    assert results[0].match == {"fulltext": {"in holes"}}
+    # Without an index it's an ordinary field
+    assert list(query.search(data, ["fulltext:in holes"])) == []
+    index.close()
+
+
+def test_list_fulltext(runner, database, tmpdir, notes):
+    data = pybibs.read_file(database)
+    data[0]["fields"]["file"] = str(notes["a.txt"])
+    pybibs.write_file(data, database)
+
+    args = ["--database", database, "list", "--format", "$key", "fulltext:hobbits"]
+    result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 1
+    assert "bibo index" in result.output
+
+    result = runner.invoke(bibo.cli, ["--database", database, "index"])
+    assert result.exit_code == 0, result.output
+    assert result.output == "Indexed 1 files\n"
+    assert os.path.exists(fulltext.index_path(database))
+
+    result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 0, result.output
+    assert result.output == "tolkien1937hobit\n"
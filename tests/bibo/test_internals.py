@@ -1,4 +1,5 @@
 import os
+from unittest import mock
 
 import click
 import pytest  # type: ignore
@@ -99,6 +100,14 @@ def test_format_entry():
     assert internals.format_entry(entry, "$year: $title") == "1937: The Hobbit"
 
 
+def test_compile_format():
+    format_ = internals.compile_format("{$key} $$type $missing $")
+    assert internals.compile_format("{$key} $$type $missing $") is format_
+    entry = {"key": "k", "type": "book", "fields": {"title": "{T}"}}
+    assert format_(entry) == "{k} book $missing $"
+    assert internals.compile_format("$title")(entry) == "{T}"
+
+
 def test_highlight_text():
     s1 = "hello world"
     s2 = "hello {}orld".format(internals.bold("w"))
@@ -149,6 +158,17 @@ def test_highlight_match_case_insensitive():
     assert extra_match_info == {}
 
 
+def test_highlight_match_latex():
+    text = "Schrödinger's cat"
+    entry = {"fields": {"title": "Schr{\\\"o}dinger's cat"}}
+    match = {"fields": {"title": set(['Schr{\\"o}dinger'])}}
+    result = models.SearchResult(entry, match)
+
+    text, extra_match_info = internals.highlight_match(text, result)
+    assert text == internals.bold("Schrödinger") + "'s cat"
+    assert extra_match_info == {}
+
+
 def test_highlight_text_escapes_ansi():
     # Testing issue #78
     text = click.style("Green text", fg="green")
@@ -157,3 +177,189 @@ def test_highlight_text_escapes_ansi():
 
     assert "m" in text  # because it's part of the ANSI code for green
     assert internals.highlight_text(text, "m") == text
+
+
+def test_latex_to_text():
+    assert internals.latex_to_text(r"Ath{\'e}na{\"i}s") == "Athénaïs"
+    assert internals.latex_to_text("234--247") == "234–247"
+    assert internals.latex_to_text("No latex here") == "No latex here"
+
+
+def test_latex_to_text_fast_path():
+    internals._cached_latex_to_text.cache_clear()
+    internals.latex_to_text("No latex here")
+    assert internals._cached_latex_to_text.cache_info().currsize == 0
+    internals.latex_to_text(r"K\"onig")
+    internals.latex_to_text(r"K\"onig")
+    assert internals._cached_latex_to_text.cache_info().hits == 1
+
+
+def test_plugin_group_loads_plugins_lazily():
+    @click.command()
+    def hello():
+        click.echo("hello")
+
+    good = mock.Mock(value="plugin:hello")
+    good.name = "hello"
+    good.load.return_value = hello
+    broken = mock.Mock(value="broken:cmd")
+    broken.name = "broken"
+    broken.load.side_effect = ImportError("no such module")
+
+    group = internals.PluginGroup()
+    with mock.patch("bibo.internals.get_plugins", return_value=[good, broken]):
+        ctx = click.Context(group)
+        assert group.list_commands(ctx) == ["broken", "hello"]
+        good.load.assert_not_called()
+        assert group.get_command(ctx, "hello") is hello
+        assert "could not be loaded" in group.get_command(ctx, "broken").help
+
+
+def test_scan_keys():
+    raw = """
+        @string{pub = "Publisher"}
+
+        @article{a,
+            title = {Mail me @home{x, y}},
+        }
+
+        @Book ( b ,
+            title = {B},
+        )
+        """
+    assert internals.scan_keys(raw) == ["a", "b"]
+
+
+def test_load_keys_uses_cache(database, tmpdir, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir / "cache"))
+    keys = internals.load_keys(database)
+    assert "tolkien1937hobit" in keys
+
+    with mock.patch("bibo.internals.scan_keys") as scan_keys_mock:
+        assert internals.load_keys(database) == keys
+        scan_keys_mock.assert_not_called()
+
+    with open(database, "a") as f:
+        f.write("\n\n@book{new,\n  title = {New},\n}")
+    assert internals.load_keys(database) == keys + ["new"]
+
+
+def test_load_keys_missing_database(tmpdir):
+    assert internals.load_keys(str(tmpdir / "missing.bib")) == []
+
+
+def test_write_database(database):
+    data, fingerprint = internals.read_database(database)
+    obj = {"database": database, "data": data, "fingerprint": fingerprint}
+    data.pop()
+    internals.write_database(obj)
+    assert obj["fingerprint"] != fingerprint
+    assert internals.read_database(database) == (data, obj["fingerprint"])
+
+
+def test_write_database_changed_without_merge(database):
+    data, fingerprint = internals.read_database(database)
+    obj = {"database": database, "data": data, "fingerprint": fingerprint}
+    with open(database, "a") as f:
+        f.write("\n\n@book{new,\n  title = {New},\n}")
+    with open(database) as f:
+        content = f.read()
+    data.pop()
+    with pytest.raises(click.ClickException, match="changed"):
+        internals.write_database(obj)
+    with open(database) as f:
+        assert f.read() == content
+
+
+def test_write_database_changed_with_merge(database):
+    data, fingerprint = internals.read_database(database)
+    obj = {"database": database, "data": data, "fingerprint": fingerprint}
+    with open(database, "a") as f:
+        f.write("\n\n@book{new,\n  title = {New},\n}")
+    entry = {"type": "book", "key": "mine", "fields": {"title": "Mine"}}
+    data.append(entry)
+    internals.write_database(obj, lambda current: current.append(entry))
+    keys = [e["key"] for e in internals.bib_entries(internals.load_database(database))]
+    assert keys[-2:] == ["new", "mine"]
+    assert obj["data"][-1] is entry
+
+
+def test_database_lock_timeout(database):
+    with internals.database_lock(database):
+        with pytest.raises(click.ClickException, match="another process"):
+            with internals.database_lock(database, timeout=0.05):
+                pass
+    with internals.database_lock(database, timeout=0.05):
+        pass
+
+
+def test_database_lock_leaves_no_file_next_to_the_database(database, tmpdir):
+    link = str(tmpdir / "link.bib")
+    os.symlink(database, link)
+    with internals.database_lock(database):
+        # The same database through another path
+        with pytest.raises(click.ClickException, match="another process"):
+            with internals.database_lock(link, timeout=0.05):
+                pass
+    assert not [f for f in os.listdir(os.path.dirname(database)) if "lock" in f]
+
+
+def test_unique_key():
+    assert internals.unique_key("a", set()) == "a"
+    assert internals.unique_key("a", {"a", "aa"}) == "ab"
+    keys = {"k"} | {"k" + chr(ord("a") + i) for i in range(26)}
+    assert internals.unique_key("k", keys) == "kaa"
+
+
+def test_normalise_doi():
+    assert internals.normalise_doi(" https://doi.org/10.1/ABC\n") == "10.1/abc"
+    assert internals.normalise_doi("doi:10.1/abc") == "10.1/abc"
+    assert internals.normalise_doi("http://dx.doi.org/10.1/abc") == "10.1/abc"
+
+
+def test_normalise_text():
+    expected = "schrodinger s cat"
+    assert internals.normalise_text(r"Schr{\"o}dinger's Cat") == expected
+    assert internals.normalise_text(r"Schr\"{o}dinger's \emph{cat}") == expected
+    assert internals.normalise_text("Schrödinger’s CAT!") == expected
+    assert internals.normalise_text(r"{\O}stergaard") == "ostergaard"
+
+
+def test_split_authors():
+    authors = " Tolkien, John R. R. and Isaac  Asimov AND Plato"
+    assert internals.split_authors(authors) == [
+        ("Tolkien", "John R. R."),
+        ("Asimov", "Isaac"),
+        ("Plato", ""),
+    ]
+    assert internals.split_authors("") == []
+
+
+@pytest.mark.parametrize(
+    "s, expected",
+    [
+        ("Plain", "Plain"),
+        ('Schr{\\"o}dinger', "Schrodinger"),
+        ('Schr\\"{o}dinger', "Schrodinger"),
+        ("Schrödinger", "Schrodinger"),
+        ("{\\v{S}}koda \\c c", "Skoda c"),
+        ("Stra{\\ss}e \\& \\emph{Co}", "Strasse & Co"),
+        ('na{\\"\\i}ve', "naive"),
+    ],
+)
+def test_search_text(s, expected):
+    assert internals.search_text(s) == expected
+
+
+def test_search_text_source():
+    folded = internals.SearchText('The {Schr\\"{o}dinger} Cat')
+    assert folded.text == internals.search_text('The {Schr\\"{o}dinger} Cat')
+    start = folded.text.index("Schrodinger")
+    end = start + len("Schrodinger")
+    assert folded.source(start, end) == 'Schr\\"{o}dinger'
+    assert folded.source(start + 4, start + 5) == '\\"{o}'
+    assert internals.SearchText("Cat").source(0, 2) == "Ca"
+
+
+def test_fold_accents():
+    assert internals.fold_accents("Schrödinger\\b[ö]") == "Schrodinger\\b[o]"
@@ -0,0 +1,127 @@
+import pybibs
+import pytest  # type: ignore
+
+from bibo import bibo, internals, merge
+
+INCOMING = """
+@book{hobbit, title={The {H}obbit}, year={1937}}
+@book{tolkien1954lord, title={Unfinished Tales}, year={1980}}
+@article{new, title={Something new}, doi={10.1/New}}
+@article{new2, title={Something else}, doi={https://doi.org/10.1/new}}
+@string{foo = "Not Mrs. Foo"}
+@string{bar = "Mr. Bar"}
+@comment{Ignored}
+@preamble{"\\newcommand{\\noopsort}[1]{}"}
+"""
+
+
+@pytest.fixture()
+def incoming(tmpdir):
+    path = tmpdir / "incoming.bib"
+    path.write(INCOMING)
+    return str(path)
+
+
+def _import(runner, database, *args):
+    args = ("--database", database, "import") + args
+    return runner.invoke(bibo.cli, args)
+
+
+def _entries(database):
+    return {e["key"]: e for e in pybibs.read_file(database) if "key" in e}
+
+
+def test_content_hashes():
+    entry = {"fields": {"doi": "doi:10.1/A", "title": "{\\'E}t\\'e", "year": "2000"}}
+    assert merge.content_hashes(entry) == [("doi", "10.1/a"), ("title", "ete", "2000")]
+    assert merge.content_hashes({"fields": {}}) == []
+
+
+def test_import_skip(runner, database, incoming):
+    result = _import(runner, database, incoming)
+    assert result.exit_code == 0, result.output
+    assert '"hobbit": duplicate of "tolkien1937hobit", skipped' in result.output
+    assert '"tolkien1954lord": key exists' in result.output
+    assert '"new2": duplicate of "new", skipped' in result.output
+    assert '"foo": @string with a different value than "foo", skipped' in (
+        result.output
+    )
+    assert "@preamble: not imported, skipped" in result.output
+    assert "2 added, 0 renamed, 0 overwritten, 5 skipped" in result.output.lower()
+
+    entries = _entries(database)
+    assert "hobbit" not in entries
+    assert entries["tolkien1954lord"]["fields"]["title"] == "The Lord of the Rings"
+    assert entries["new"]["fields"]["doi"] == "10.1/New"
+    assert entries["foo"]["val"] == "Mrs. Foo"
+    assert entries["bar"]["val"] == "Mr. Bar"
+
+
+def test_import_rename(runner, database, incoming):
+    result = _import(runner, database, "--on-conflict", "rename", incoming)
+    assert result.exit_code == 0, result.output
+    assert '"tolkien1954lord": key exists, renamed to "tolkien1954lorda"' in (
+        result.output
+    )
+    entries = _entries(database)
+    assert entries["tolkien1954lorda"]["fields"]["title"] == "Unfinished Tales"
+    assert "hobbit" not in entries
+
+
+def test_import_overwrite(runner, database, incoming):
+    result = _import(runner, database, "--on-conflict", "overwrite", incoming)
+    assert result.exit_code == 0, result.output
+    entries = _entries(database)
+    assert entries["tolkien1937hobit"]["fields"] == {
+        "title": "The {H}obbit",
+        "year": "1937",
+    }
+    assert entries["tolkien1954lord"]["fields"]["title"] == "Unfinished Tales"
+    assert entries["new"]["fields"]["title"] == "Something else"
+    assert entries["foo"]["val"] == "Not Mrs. Foo"
+
+
+def test_import_parse_error(runner, database, tmpdir, incoming):
+    bad = tmpdir / "bad.bib"
+    bad.write("@article{a title=}")
+    with open(database) as f:
+        before = f.read()
+    result = _import(runner, database, incoming, str(bad))
+    assert result.exit_code == 1
+    assert "Failed to parse" in result.output
+    with open(database) as f:
+        assert f.read() == before
+
+
+def test_import_parse_error_leaves_loaded_data(runner, database, tmpdir, incoming):
+    # As in `bibo shell`, where the data outlives the command
+    bad = tmpdir / "bad.bib"
+    bad.write("@article{a title=}")
+    data = internals.load_database(database)
+    before = pybibs.write_string(data)
+    obj = {"database": database, "data": data, "defer_write": True}
+    args = ["--database", database, "import", "--on-conflict", "overwrite"]
+    result = runner.invoke(bibo.cli, args + [incoming, str(bad)], obj=obj)
+    assert result.exit_code == 1
+    assert pybibs.write_string(obj["data"]) == before
+    assert not obj.get("changed")
+
+
+def test_merge_indexes_added_entries():
+    data = []
+    m = merge.Merge(data)
+    m.add({"type": "book", "key": "a", "fields": {"title": "T", "year": "1"}})
+    m.add({"type": "book", "key": "b", "fields": {"title": "t", "year": "1"}})
+    m.add({"type": "book", "key": "a", "fields": {"title": "U"}})
+    assert [e["key"] for e in data] == ["a"]
+    assert m.counts == {"added": 1, "skipped": 2}
+    assert internals.unique_key("a", m.by_key) == "aa"
+
+
+def test_merge_strings():
+    data = [{"type": "string", "key": "foo", "val": "Foo"}]
+    m = merge.Merge(data)
+    m.add({"type": "string", "key": "FOO", "val": "Foo"})
+    m.add({"type": "string", "key": "bar", "val": "Bar"})
+    assert len(data) == 2
+    assert m.counts == {"added": 1}
@@ -1,7 +1,9 @@
+from unittest import mock
+
 import click
 import pytest  # type: ignore
 
-from bibo import models, query
+from bibo import internals, models, query
 import pybibs
 
 
@@ -244,3 +246,83 @@ def test_nested_update():
     d = {}
     u = {"x": set("X")}
     assert query._nested_update(d, u) == {"x": set("X")}
+
+
+SORT_DATA = pybibs.read_string(
+    """
+    @book{c, year = {1999}, author = {{\\"O}berg, Ann and Zed, Z.}, title = {b}}
+    @book{a, year = {2001a}, author = {Bob Alpha}, title = {{B}}}
+    @article{b, year = {in press}, title = {A}}
+    @book{d, year = {31}, author = {Alpha, Al}}
+    """
+)
+
+
+def test_sort_key():
+    c, a, b, d = SORT_DATA
+    assert query.sort_key(c, ["year", "author"]) == (
+        (False, 1999, ""),
+        (False, 0, "oberg ann"),
+    )
+    assert query.sort_key(b, ["year", "type"]) == ((True, 0, ""), (False, 0, "article"))
+    assert query.sort_key(b, ["author"], reverse=True) == ((False, 0, ""),)
+
+
+@pytest.mark.parametrize(
+    "fields, reverse, expected",
+    [
+        (["year"], False, ["d", "c", "a", "b"]),
+        (["year"], True, ["a", "c", "d", "b"]),
+        (["author"], False, ["d", "a", "c", "b"]),
+        (["title", "key"], False, ["b", "a", "c", "d"]),
+        (["title"], True, ["c", "a", "b", "d"]),  # Stable
+    ],
+)
+def test_sort(fields, reverse, expected):
+    results = list(query.search(SORT_DATA, []))
+    sorted_results = query.sort(results, fields, reverse)
+    assert [r.entry["key"] for r in sorted_results] == expected
+    for limit in range(5):
+        top = query.sort(iter(results), fields, reverse, limit)
+        assert [r.entry["key"] for r in top] == expected[:limit]
+
+
+@pytest.mark.parametrize(
+    "term, expected",
+    [
+        ("schrodinger", {"title": {'Schr{\\"o}dinger'}, "author": {"Schrödinger"}}),
+        ("Schrödinger", {"title": {'Schr{\\"o}dinger'}, "author": {"Schrödinger"}}),
+        ("title:ö", {"title": {'{\\"o}'}}),
+        ("title:r.d", {"title": {'r{\\"o}d'}}),
+    ],
+)
+def test_search_ignores_latex_and_accents(term, expected):
+    data = pybibs.read_string(
+        """
+        @article{cat, title = {Schr{\\"o}dinger's cat}, author = {Schrödinger, E.}}
+        """
+    )
+    (result,) = query.search(data, [term])
+    assert result.match == {"fields": expected}
+
+
+def test_search_folds_a_value_once():
+    # E.g. the full text of a file, with many matches
+    text = 'Schr{\\"o}dinger and ' * 1000
+    entry = {"type": "book", "key": "k", "fields": {"note": text}}
+    texts = internals.SearchTexts()
+    with mock.patch(
+        "bibo.internals.SearchText", wraps=internals.SearchText
+    ) as search_text_mock:
+        (result,) = query.search([entry], ["schrodinger"], texts=texts)
+        assert list(query.search([entry], ["dinger", "and"], texts=texts))
+    search_text_mock.assert_called_once_with(text)
+    assert result.match == {"fields": {"note": {'Schr{\\"o}dinger'}}}
+    assert list(texts) == [text]
+
+
+def test_get_by_key_with_index():
+    entry = {"type": "book", "key": "a", "fields": {}}
+    assert query.get_by_key([], "a", {"a": entry}) is entry
+    with pytest.raises(click.ClickException):
+        query.get_by_key([entry], "a", {})
@@ -0,0 +1,170 @@
+import io
+import subprocess
+import sys
+import time
+from unittest import mock
+
+from bibo import bibo, internals, shell
+
+
+def _shell(database, commands, **kwargs):
+    stdin = io.StringIO("\n".join(commands) + "\n")
+    data = internals.load_database(database)
+    s = shell.Shell(bibo.cli, database, data, stdin=stdin, **kwargs)
+    s.use_rawinput = False
+    return s
+
+
+def _bibo(database, *args):
+    code = "from bibo.bibo import cli; cli()"
+    subprocess.run(
+        [sys.executable, "-c", code, "--database", database] + list(args),
+        check=True,
+    )
+
+
+def _read(database):
+    with open(database) as f:
+        return f.read()
+
+
+def test_commands_share_the_loaded_database(database, capsys):
+    commands = [
+        "edit asimov1951foundation year=1952",
+        "list --format $year asimov",
+        "exit",
+    ]
+    s = _shell(database, commands)
+    s.cmdloop(intro="")
+    assert "1952" in capsys.readouterr().out
+    assert "year = {1952}" in _read(database)
+
+
+def test_writes_on_save_only(database, capsys):
+    s = _shell(database, [])
+    s.onecmd("remove asimov1951foundation")
+    assert "asimov1951foundation" in _read(database)
+    s.onecmd("list --format $key asimov")
+    assert capsys.readouterr().out == ""
+    s.onecmd("save")
+    assert "asimov1951foundation" not in _read(database)
+
+
+def test_failing_command_changes_nothing(database, capsys):
+    s = _shell(database, [])
+    s.onecmd("edit asimov1951foundation year=1952 key=tolkien1937hobit")
+    assert "Duplicate key" in capsys.readouterr().err
+    s.onecmd("list --format $year asimov")
+    assert capsys.readouterr().out == "1951\n"
+
+
+def test_other_database_is_rejected(database, tmpdir, capsys):
+    other = str(tmpdir / "other.bib")
+    with open(other, "w") as f:
+        f.write("@book{other,\n  title = {Other},\n}")
+    text = _read(database)
+    s = _shell(database, [])
+    s.onecmd("--database {} remove other".format(other))
+    assert "not available" in capsys.readouterr().out
+    s.onecmd("exit")
+    assert _read(database) == text
+    assert "@book{other" in _read(other)
+
+
+def test_commands_run_against_the_database_of_the_shell(
+    database, tmpdir, capsys, monkeypatch
+):
+    other = str(tmpdir / "other.bib")
+    with open(other, "w") as f:
+        f.write("@book{other,\n  title = {Other},\n}")
+    monkeypatch.setattr(shell, "_TOP_LEVEL_OPTIONS", ["--database"])
+    s = _shell(database, [])
+    s.onecmd("edit asimov1951foundation year=1952")
+    s.onecmd("--database {} remove other".format(other))
+    assert "another database" in capsys.readouterr().out
+    assert s.obj["database"] == database
+    assert len(s.obj["merges"]) == 1
+    s.onecmd("exit")
+    assert "year = {1952}" in _read(database)
+    assert "tolkien1937hobit" in _read(database)
+
+
+def test_autosave(database):
+    s = _shell(database, [], autosave=0.01)
+    s.onecmd("edit asimov1951foundation year=1952")
+    for _ in range(100):
+        if "year = {1952}" in _read(database):
+            break
+        time.sleep(0.01)
+    else:
+        raise AssertionError("Not saved")
+
+
+def test_save_applies_changes_to_external_change(database):
+    s = _shell(database, [])
+    s.onecmd("edit asimov1951foundation year=1952")
+    _bibo(database, "edit", "tolkien1937hobit", "year=1938")
+    assert s.save()
+    text = _read(database)
+    assert "year = {1952}" in text
+    assert "year = {1938}" in text
+    assert s.watcher.data == internals.load_database(database)
+
+
+def test_save_refuses_to_overwrite_external_change(database, capsys):
+    s = _shell(database, [])
+    s.onecmd("edit asimov1951foundation year=1952")
+    _bibo(database, "remove", "asimov1951foundation")
+    text = _read(database)
+    assert not s.save()
+    assert 'Use "reload"' in capsys.readouterr().err
+    assert _read(database) == text
+    s.onecmd("reload")
+    s.onecmd("list --format $key asimov")
+    assert capsys.readouterr().out == ""
+    assert s.save()
+    assert _read(database) == text
+
+
+def test_reload_on_external_change(database, capsys):
+    s = _shell(database, [])
+    with open(database, "a") as f:
+        f.write("\n\n@book{new,\n  title = {New},\n}")
+    s.onecmd("list --format $key new")
+    assert capsys.readouterr().out == "new\n"
+
+
+def test_excluded_commands(database, capsys):
+    s = _shell(database, [])
+    s.onecmd("shell")
+    assert "not available" in capsys.readouterr().out
+
+
+def test_complete(database):
+    s = _shell(database, [])
+    assert s.completenames("ed") == ["edit"]
+    assert s.completedefault("tolkien19", "edit tolkien19", 5, 14) == [
+        "tolkien1937hobit",
+        "tolkien1954lord",
+    ]
+
+
+def test_key_lookups_use_the_index_of_the_watcher(database, capsys):
+    s = _shell(database, [])
+    with mock.patch("bibo.internals.bib_entries", side_effect=AssertionError):
+        assert s.completedefault("tolkien19", "edit tolkien19", 5, 14) == [
+            "tolkien1937hobit",
+            "tolkien1954lord",
+        ]
+        s.onecmd("remove tolkien1937hobit")
+    assert capsys.readouterr().err == ""
+    # The index is stale until the change is saved
+    assert s.completedefault("tolkien19", "edit tolkien19", 5, 14) == [
+        "tolkien1954lord"
+    ]
+    s.onecmd("remove tolkien1937hobit")
+    assert "Couldn't find" in capsys.readouterr().err
+    s.onecmd("save")
+    s.onecmd("list")
+    assert s.obj["keys"] is s.watcher.keys
+    assert "tolkien1937hobit" not in s.obj["keys"]
@@ -0,0 +1,59 @@
+"""
+Startup time benchmarks. Run with ``python -X importtime`` and check that heavy
+dependencies are only imported by the commands that need them.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest  # type: ignore
+
+# Generous, to catch regressions rather than measure exact timing (about
+# 40 ms on a laptop)
+IMPORT_TIME_THRESHOLD_US = 200_000
+HEAVY_MODULES = ["requests", "pyperclip", "pylatexenc", "bibo.cite"]
+
+
+def _import_times(args, runtime_dir):
+    """
+    Run bibo with `args`, as the ``bibo`` command does (trying the daemon
+    first), and return a {module: cumulative import time in microseconds}
+    dict.
+    """
+    code = "from bibo.daemon import main; main()"
+    # No daemon serves the database there
+    env = dict(os.environ, XDG_RUNTIME_DIR=runtime_dir)
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code] + args,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "args, allowed",
+    [
+        (["--help"], []),
+        (["list", "--format", "$key"], []),
+        (["list"], ["pylatexenc", "bibo.cite"]),
+    ],
+)
+def test_startup_imports(database, tmpdir, args, allowed):
+    runtime_dir = str(tmpdir / "runtime")
+    os.mkdir(runtime_dir, 0o700)
+    times = _import_times(["--database", database] + args, runtime_dir)
+    for module in HEAVY_MODULES:
+        if module not in allowed:
+            assert module not in times
+    # The client, then the command when it runs in this process
+    assert times["bibo.daemon"] + times["bibo.bibo"] < IMPORT_TIME_THRESHOLD_US
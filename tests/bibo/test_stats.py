@@ -0,0 +1,54 @@
+import json
+
+from bibo import bibo, stats
+
+ENTRIES = [
+    {
+        "type": "Book",
+        "key": "a",
+        "fields": {"year": "1937", "author": "Tolkien, J.", "tags": "fantasy, read"},
+    },
+    {
+        "type": "book",
+        "key": "b",
+        "fields": {"year": "1954", "author": "John Tolkien and C. Tolkien"},
+    },
+    {"type": "article", "key": "c", "fields": {"year": "1937", "tags": "read"}},
+]
+
+
+def test_columns():
+    columns = stats.columns(ENTRIES)
+    assert columns["type"] == ["book", "book", "article"]
+    assert columns["year"] == ["1937", "1954", "1937"]
+    assert columns["tags"] == ["fantasy", "read", "read"]
+    assert [key for key, _ in columns["author"]] == [
+        ("tolkien", "j"),
+        ("tolkien", "j"),
+        ("tolkien", "c"),
+    ]
+
+
+def test_stats():
+    result = stats.stats(ENTRIES, top=1)
+    assert result == {
+        "entries": 3,
+        "types": {"book": 2, "article": 1},
+        "years": {"1937": 2, "1954": 1},
+        "tags": {"read": 2, "fantasy": 1},
+        "authors": {"Tolkien, J.": 2},
+    }
+    text = stats.format_text(result)
+    assert "  1937  " + "#" * stats.HISTOGRAM_WIDTH + " 2" in text
+    assert "  1954  " + "#" * (stats.HISTOGRAM_WIDTH // 2) + " 1" in text
+
+
+def test_stats_command(runner, database):
+    args = ["--database", database, "stats", "--json", "tolkien"]
+    result = runner.invoke(bibo.cli, args)
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["authors"] == {"Tolkien, John R. R.": 2}
+
+    result = runner.invoke(bibo.cli, ["--database", database, "stats"])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("Entries: 6\n\nTypes\n  book ")
@@ -0,0 +1,208 @@
+import os
+import random
+import time
+from unittest import mock
+
+import pytest  # type: ignore
+
+import pybibs
+from bibo import internals, watch
+
+# Generous, to catch regressions rather than measure exact timing. Loading
+# the whole file takes several times longer.
+BENCHMARK_SIZE = 100_000
+BENCHMARK_THRESHOLD_S = 2
+
+
+def _entry(i, key=None):
+    return "@book{{{},\n  author = {{Author {}}},\n  title = {{Title {}}},\n}}".format(
+        key or "key{}".format(i), 'Schr{\\"o}dinger' if i % 3 else i, i
+    )
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    # Make sure the change is noticed even if the size and modification
+    # time don't change
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def _first_keys(data):
+    keys = {}
+    for entry in internals.bib_entries(data):
+        keys.setdefault(entry["key"], entry)
+    return keys
+
+
+def _assert_like_full_reload(watcher, path):
+    assert watcher.data == pybibs.read_file(path)
+    assert watcher.keys == _first_keys(watcher.data)
+    for key, entry in watcher.keys.items():
+        assert entry is _first_keys(watcher.data)[key]
+    values = set(
+        v for e in watcher.data if "fields" in e for v in internals.search_values(e)
+    )
+    assert set(watcher.search_texts) == values
+    for value, folded in watcher.search_texts.items():
+        assert folded.text == internals.search_text(value)
+
+
+@pytest.fixture()
+def path(tmpdir):
+    path = str(tmpdir / "watched.bib")
+    _write(path, "\n\n".join(_entry(i) for i in range(20)))
+    return path
+
+
+def test_load(path):
+    watcher = watch.Watcher(path)
+    assert len(watcher.data) == 20
+    assert watcher.keys["key3"]["fields"]["title"] == "Title 3"
+    assert not watcher.changed()
+    watcher.close()
+
+
+def test_only_changed_entries_are_parsed(path):
+    watcher = watch.Watcher(path)
+    unchanged = watcher.data[0]
+    with open(path) as f:
+        text = f.read()
+    _write(path, text.replace("Title 7}", "Title seven}"))
+    with mock.patch("pybibs.read_entry_string", wraps=pybibs.read_entry_string) as m:
+        watcher.refresh()
+    assert m.call_count == 1
+    assert watcher.keys["key7"]["fields"]["title"] == "Title seven"
+    assert watcher.data[0] is unchanged
+    _assert_like_full_reload(watcher, path)
+    watcher.close()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_update_is_like_full_reload(path, seed):
+    rng = random.Random(seed)
+    watcher = watch.Watcher(path)
+    with open(path) as f:
+        text = f.read()
+    for n in range(30):
+        spans = list(watch._split(text))
+        s, e = rng.choice(spans) if spans else (0, 0)
+        edit = rng.randrange(7)
+        if edit == 0:  # Change a field
+            text = text[:s] + text[s:e].replace("Title", "Other title") + text[e:]
+        elif edit == 1:  # Remove an entry
+            text = text[:s] + text[e:]
+        elif edit == 2:  # Add an entry, maybe with a duplicate key
+            key = rng.choice(["dup", None, "key1"])
+            text = text[:s] + _entry(100 + n, key) + "\n\n" + text[s:]
+        elif edit == 3:  # Change a key
+            text = text[:s] + text[s:e].replace("{key", "{renamed", 1) + text[e:]
+        elif edit == 4:  # Text between entries
+            text = text[:e] + "\nA comment with an @ sign\n" + text[e:]
+        elif edit == 5:  # Several entries at once
+            s2, e2 = rng.choice(spans) if spans else (0, 0)
+            text = text[: min(s, s2)] + _entry(200 + n) + text[max(e, e2) :]
+        else:  # A new string, with the same end as another entry
+            text = text[:s] + '@string{{s{} = "x"}}\n'.format(n) + text[s:]
+        _write(path, text)
+        watcher.refresh()
+        _assert_like_full_reload(watcher, path)
+    watcher.close()
+
+
+def test_missing_file(tmpdir):
+    path = str(tmpdir / "missing.bib")
+    watcher = watch.Watcher(path)
+    assert watcher.data == []
+    _write(path, _entry(1))
+    assert [e["key"] for e in watcher.refresh()] == ["key1"]
+    os.remove(path)
+    assert watcher.refresh() == []
+    assert watcher.keys == {}
+    watcher.close()
+
+
+def test_parse_error_keeps_entries(path):
+    watcher = watch.Watcher(path)
+    with open(path) as f:
+        text = f.read()
+    _write(path, text + "\n\n@book{broken}")
+    with pytest.raises(ValueError):
+        watcher.refresh()
+    assert len(watcher.data) == 20
+    _write(path, text + "\n\n" + _entry(20))
+    assert len(watcher.refresh()) == 21
+    _assert_like_full_reload(watcher, path)
+    watcher.close()
+
+
+def test_sync(path):
+    watcher = watch.Watcher(path)
+    data = watcher.data
+    data[0]["fields"]["title"] = "Changed"
+    internals.write_file_atomically(data, path)
+    with mock.patch("pybibs.read_entry_string") as m:
+        watcher.sync(data)
+        assert watcher.refresh() is data
+    m.assert_not_called()
+    _assert_like_full_reload(watcher, path)
+    watcher.close()
+
+
+def test_sync_after_someone_else_wrote(path):
+    watcher = watch.Watcher(path)
+    data = watcher.data
+    _write(path, _entry(1))
+    watcher.sync(data)
+    assert [e["key"] for e in watcher.data] == ["key1"]
+    watcher.close()
+
+
+def _start(path, **kwargs):
+    watcher = watch.Watcher(path)
+    watcher.start(**kwargs)
+    return watcher
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_background_refresh(path, backend):
+    with mock.patch.object(watch, "_Inotify", side_effect=OSError):
+        if backend == "poll":
+            watcher = _start(path, interval=0.01)
+    if backend == "inotify":
+        watcher = _start(path)
+        if watcher.backend != "inotify":
+            watcher.close()
+            pytest.skip("inotify is not available")
+    assert watcher.backend == backend
+
+    with open(path) as f:
+        text = f.read()
+    # Replaced, as editors and `bibo` do
+    _write(path + ".tmp", text + "\n\n" + _entry(20))
+    os.replace(path + ".tmp", path)
+    for _ in range(200):
+        with watcher.lock:
+            if len(watcher.data) == 21:
+                break
+        time.sleep(0.01)
+    else:
+        raise AssertionError("Not refreshed")
+    _assert_like_full_reload(watcher, path)
+    watcher.close()
+
+
+@pytest.mark.benchmark
+def test_update_benchmark(tmpdir):
+    path = str(tmpdir / "large.bib")
+    _write(path, "\n\n".join(_entry(i) for i in range(BENCHMARK_SIZE)))
+    watcher = watch.Watcher(path)
+    with open(path) as f:
+        text = f.read()
+    _write(path, text.replace("Title 50000}", "Title fifty thousand}"))
+
+    start = time.perf_counter()
+    assert watcher.refresh()[50000]["fields"]["title"] == "Title fifty thousand"
+    assert time.perf_counter() - start < BENCHMARK_THRESHOLD_S
+    watcher.close()
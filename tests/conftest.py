@@ -0,0 +1,22 @@
+import os
+
+import pytest  # type: ignore
+
+BENCHMARKS_ENV_VAR = "BIBO_BENCHMARKS"
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "benchmark: slow benchmark on a large database, only run when the "
+        "{} environment variable is set".format(BENCHMARKS_ENV_VAR),
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get(BENCHMARKS_ENV_VAR):
+        return
+    skip = pytest.mark.skip(reason="set {} to run".format(BENCHMARKS_ENV_VAR))
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)